@@ -1,26 +1,34 @@
-from io import StringIO
+# Annotations are not evaluated so that the modules they refer to can be
+# loaded only when their section runs
+from __future__ import annotations
+
 from datetime import datetime, timedelta, date, time
 from zoneinfo import ZoneInfo
-import json
-from time import sleep
+import os
+import threading
+from typing import Callable
 
 import streamlit as st
-import requests
 import pandas as pd
 import numpy as np
-import plotly.express as px
 
 import constants
-import utils
-from meteo_france import Client
+import communes
+import prefetch
+
+# The api, geodesic and plotting modules are imported by the sections using
+# them, so that the page is displayed without loading them until a city is
+# selected or a chart is drawn
+
+# Hourly parameters displayed for observations at another date
+OTHER_DATE_PARAMETERS = ['T', 'U', 'FF', 'RR1', 'VV', 'NEIGETOT', 'INS', 'PSTAT']
 
 # -- Application functions
 
 @st.cache_data
 def import_api_daily_parameters() -> pd.DataFrame:
     """Import climatological api parameters in a DataFrame"""
-    df = pd.read_csv('datasets/api-clim-table-parametres-quotidiens.csv',
-                     sep=';')
+    df = pd.read_csv(constants.DAILY_PARAMETERS_PATH, sep=';')
 
     return df
 
@@ -40,67 +48,92 @@ def get_station_info(coordinates: list[float]) -> dict:
     return utils.filter_nearest_station_information(coordinates)
 
 
+@st.cache_data(max_entries=5)
+def get_nearby_stations(coordinates: list[float]) -> list[dict]:
+    """Call function with cache decorator to retrieve the nearest observation
+    stations.
+
+    Args:
+        coordinates (list[float]): city latitude and longitude.
+
+    Returns:
+        list[dict]: stations information, nearest first.
+    """
+
+    return utils.nearest_stations_information(
+        coordinates, constants.NEAREST_STATIONS_COUNT)
+
+
 @st.cache_data(ttl=timedelta(minutes=20))
-def get_observation(id_station: str) -> tuple[dict]:
+def get_observation(ids_station: tuple[str]) -> tuple[str, dict, dict]:
     """Call function with cache decorator to get current hourly observation and
-    the one an hour before.
+    the one an hour before, from the first station of the list reporting.
 
     Args:
-        id_station (str): id of nearest observation station.
+        ids_station (tuple[str]): id of the nearest observation stations,
+        nearest first.
 
     Returns:
-        tuple[dict]: observations.
+        tuple[str, dict, dict]: id of the station and observations.
     """
-    
-    # Get current available observation
-    current_response = Client().get_hourly_observation(
-        id_station, '')
-    
-    if current_response.status_code == requests.codes.ok:
-        try:
-            # Convert response to dictionnary
-            current_observation = current_response.json()[0]
-            # Calculate the previous validity time
-            previous_validity_time = (
-                datetime.strptime(current_observation.get('validity_time'), constants.DATETIME_FORMAT)
-                - timedelta(hours=1)
-            ).strftime(constants.DATETIME_FORMAT)
-        except json.JSONDecodeError:
-            raise Exception('Erreur de décodage de la réponse JSON.')
-    else:
-        raise Exception(
-            f'''Echec de la récupération des données.  
-            {current_response.status_code} : {current_response.reason}
-            ''')
+
+    # Get current available observation of the stations concurrently
+    id_station, current_observation = observations.first_available(
+        list(ids_station))
+
+    # Calculate the previous validity time
+    previous_validity_time = (
+        datetime.strptime(current_observation.get('validity_time'), constants.DATETIME_FORMAT)
+        - timedelta(hours=1)
+    ).strftime(constants.DATETIME_FORMAT)
 
     # Get the previous observation before the last one available
-    previous_response = Client().get_hourly_observation(
-        id_station, previous_validity_time)
-    
-    if previous_response.status_code == requests.codes.ok:
-        try:
-            # Convert response to dictionnary
-            previous_observation = previous_response.json()[0]
-        except json.JSONDecodeError:
-            raise Exception('Erreur de décodage de la réponse JSON.')
-    else:
-        raise Exception(
-            f'''Echec de la récupération des données.  
-            {current_response.status_code} : {current_response.reason}
-            ''')
+    try:
+        previous_observation = observations.get_observation(
+            id_station, previous_validity_time)
+    except observations.ObservationError:
+        # Deltas are not displayed
+        previous_observation = {}
 
-    return current_observation, previous_observation
+    return id_station, current_observation, previous_observation
 
-    
-@st.cache_data(max_entries=3)
-def get_other_date_observation(id_station: str, requested_date: date, requested_time: time) -> dict:
-    """"Call function with cache decorator to get hourly observation and
-    the one an hour before at another date and time than the current one.
+
+def show_order_progress(
+        progress_bar) -> Callable[[orders.OrderProgress], None]:
+    """Build the callback reporting the progress of an order in a progress bar
+    created by the caller.
+
+    Args:
+        progress_bar (DeltaGenerator): progress bar to update.
+
+    Returns:
+        Callable[[orders.OrderProgress], None]: progress callback.
+    """
+    def show_progress(progress: orders.OrderProgress):
+        progress_bar.progress(
+            progress.fraction,
+            text=f'Préparation des données... ({progress.elapsed:.0f} s, '
+                 f'{progress.attempts} tentative(s))'
+        )
+
+    return show_progress
+
+
+def fetch_other_date_observation(
+        id_station: str, requested_date: date, requested_time: time,
+        on_progress: Callable[[orders.OrderProgress], None] | None = None,
+        cancel: threading.Event | None = None) -> dict:
+    """Get hourly observation and the one an hour before at another date and
+    time than the current one.
 
     Args:
         id_station (str): id of nearest observation station ;
         requested_date (date): date of requested data ;
-        requested_time (time): time of requested data.
+        requested_time (time): time of requested data ;
+        on_progress (Callable[[orders.OrderProgress], None] | None,
+        optional): called regularly while waiting for the order, which is
+        polled in the calling thread if None ;
+        cancel (threading.Event | None, optional): set to stop polling.
 
     Returns:
         dict: observations.
@@ -112,56 +145,36 @@ def get_other_date_observation(id_station: str, requested_date: date, requested_
     other_datetime_end_utc = other_datetime_end.astimezone(tz=ZoneInfo('UTC'))
     other_datetime_start_utc = other_datetime_end_utc - timedelta(hours=1)
 
-    # Get order id from the api
-    other_date_order_response = Client().order_hourly_climatological_data(
-        id_station,
-        other_datetime_start_utc.strftime(constants.DATETIME_FORMAT),
-        other_datetime_end_utc.strftime(constants.DATETIME_FORMAT)
-    )
-    if other_date_order_response.status_code == 202:
-        try:
-            other_date_order_id = (
-                other_date_order_response
-                .json() 
-                .get('elaboreProduitAvecDemandeResponse')
-                .get('return')
-            )
-        except json.JSONDecodeError:
-            raise Exception('Erreur de décodage de la réponse JSON.')
+    # Order the data, sharing the order with the sessions requesting the same
+    # hour, and get them once ready
+    period = (other_datetime_start_utc.strftime(constants.DATETIME_FORMAT),
+              other_datetime_end_utc.strftime(constants.DATETIME_FORMAT))
+    client = Client()
+    place = lambda: client.order_hourly_climatological_data(id_station, *period)
+    key = orders.order_key(constants.ORDER_HOURLY_CLIMATOLOGICAL_URL,
+                           id_station=id_station, start=period[0],
+                           end=period[1])
+    retriever = orders.OrderRetriever(client, cancel=cancel)
+    if on_progress is None:
+        other_date_climatological_response = retriever.order(place, key=key)
     else:
-        raise Exception(
-            f'''Echec de la récupération des données.  
-            {other_date_order_response.status_code} : {other_date_order_response.reason}
-            ''')
+        other_date_climatological_response = retriever.wait_order(
+            place, key, on_progress=on_progress)
 
-    # Get data from order id and retry if data not yet ready (code 204)
-    response_code = 204
-    n_tries = 0
-    while response_code == 204 and n_tries < 5:
-        other_date_climatological_response = Client().order_recovery(
-            other_date_order_id)
-        response_code = other_date_climatological_response.status_code
-        n_tries =+ 1
-        sleep(10)
-    
     if other_date_climatological_response.status_code == 201:
         try:
-            other_date_climatological_data = other_date_climatological_response.text
-            # Import data in a DataFrame
-            df = pd.read_csv(
-                StringIO(other_date_climatological_data), sep=';')
-            # Convert 'object' data to 'float'
-            string_col = df.select_dtypes(include=['object']).columns
-            for col in string_col:
-                df[col] = df[col].str.replace(',', '.')
-                df[col] = df[col].astype('float')
+            # Import displayed parameters in a DataFrame
+            df = parsers.parse_hourly(
+                other_date_climatological_response.text,
+                OTHER_DATE_PARAMETERS
+            )
             # Replace Pandas 'NaN' with 'None'
             df = df.replace(np.nan, None)
             # Set index with 'previous' and 'current' label
             df['OBS'] = ['previous_observation', 'current_observation']
             df = df.set_index('OBS')
         except Exception as e:
-            f'Echec lors de la lecture de la réponse : {e}.'
+            raise Exception(f'Echec lors de la lecture de la réponse : {e}.')
     else:
         raise Exception(
             f'''Echec de la récupération des données.  
@@ -170,83 +183,104 @@ def get_other_date_observation(id_station: str, requested_date: date, requested_
         
     return df.to_dict('index') 
 
-       
-@st.cache_data(max_entries=3)
-def get_year_climatological_data(id_station: str, year: int) -> pd.DataFrame:
-    """Call function with cache decorator to get climatological data for a full
-    year.
+
+@st.cache_resource
+def other_date_observations() -> dict[tuple, dict]:
+    """Observations at other dates retrieved by the sessions of the process,
+    the oldest retrieved first, shared without being copied."""
+    return {}
+
+
+def get_other_date_observation(id_station: str, requested_date: date,
+                               requested_time: time) -> dict:
+    """Get hourly observation and the one an hour before at another date and
+    time than the current one, from the observations already retrieved, the
+    background retrieval if it is done or else an order displaying its
+    progress. A background retrieval still in flight is joined by the order.
 
     Args:
         id_station (str): id of nearest observation station ;
-        year (int): year of requested data.
+        requested_date (date): date of requested data ;
+        requested_time (time): time of requested data.
 
     Returns:
-        pd.DataFrame: climatological data.
+        dict: observations, shared with the other sessions so not to be
+        modified.
     """
-    if year == st.session_state.nearest_station_info.get('date_ouverture').year:
-        start_date = f'''{st.session_state.nearest_station_info.get('date_ouverture')}T00:00:00Z'''
-    else:
-        start_date = f'{year}-01-01T00:00:00Z'
-    # Define the end datetime (if selected year is the current year we probably
-    # can't end the period at end of December)
-    if year == datetime.now().year:
-        end_date = (datetime.now()-timedelta(days=2)).strftime('%Y-%m-%dT00:00:00Z')
-    else:
-        end_date = f'{year}-12-31T00:00:00Z'
+    key = (id_station, requested_date, requested_time)
+    observations = other_date_observations()
+    observation = observations.get(key)
+    if observation is not None:
+        return observation
+
+    observation = st.session_state.prefetcher.result(
+        ('other_date', *key), timeout=0)
+    if observation is None:
+        progress_bar = st.progress(0, text='Préparation des données...')
+        try:
+            observation = fetch_other_date_observation(
+                *key, on_progress=show_order_progress(progress_bar))
+        finally:
+            progress_bar.empty()
 
-    # Get data from the api
-    visualization_order_response = Client().order_daily_climatological_data(
-        id_station, start_date, end_date)
+    observations[key] = observation
+    while len(observations) > constants.OTHER_DATE_CACHE_SIZE:
+        observations.pop(next(iter(observations)), None)
 
-    if visualization_order_response.status_code == 202:
-        try:
-            visualization_order_id = (
-                visualization_order_response
-                .json() 
-                .get('elaboreProduitAvecDemandeResponse')
-                .get('return')
-            )
-        except json.JSONDecodeError:
-            raise Exception('Erreur de décodage de la réponse JSON.')
-    else:
-        raise Exception(
-            f'''Echec de la récupération des données.  
-            {visualization_order_response.status_code} : {visualization_order_response.reason}
-            ''')
+    return observation
 
-    # Get data from order id and retry if data not yet ready (code 204)
-    response_code = 204
-    n_tries = 0
-    while response_code == 204 and n_tries < 5:
-        visualization_climatological_response = Client().order_recovery(
-                visualization_order_id)
-        response_code = visualization_climatological_response.status_code
-        n_tries =+ n_tries
-        sleep(10)
-    
-    if visualization_climatological_response.status_code == 201:
-        try:
-            visualization_climatological_data = visualization_climatological_response.text
-
-            # Import data in DataFrame
-            df = pd.read_csv(StringIO(visualization_climatological_data), sep=';',
-                            parse_dates=['DATE'])
-            # Convert 'object' to 'float'
-            string_col = df.select_dtypes(include=['object']).columns
-            for col in string_col:
-                df[col] = df[col].str.replace(',', '.')
-                df[col] = df[col].astype('float')
-            # Remove all variables with only NaN
-            df =  df.dropna(axis='columns')
-        except Exception as e:
-            f'Echec lors de la lecture de la réponse : {e}.'
-    else:
-        raise Exception(
-            f'''Echec de la récupération des données.  
-            {visualization_climatological_data.status_code} : {visualization_climatological_data.reason}
-            ''')
 
-    return df
+def prefetch_other_date_observation(id_station: str, requested_date: date,
+                                    requested_time: time):
+    """Start the retrieval of the observations at another date in the
+    background, unless they have already been retrieved.
+
+    Args:
+        id_station (str): id of nearest observation station ;
+        requested_date (date): date of requested data ;
+        requested_time (time): time of requested data.
+    """
+    key = (id_station, requested_date, requested_time)
+    if key not in other_date_observations():
+        st.session_state.prefetcher.submit(
+            ('other_date', *key), fetch_other_date_observation, *key)
+
+
+def get_years_climatological_data(id_station: str, years: tuple[int],
+                                  opening_date: datetime) -> pd.DataFrame:
+    """Get climatological data for one or several full years. The years are
+    kept in memory by the climatology cache, shared by the sessions without
+    being copied, so the data must not be modified.
+
+    Args:
+        id_station (str): id of nearest observation station ;
+        years (tuple[int]): years of requested data ;
+        opening_date (datetime): opening date of the station.
+
+    Returns:
+        pd.DataFrame: climatological data.
+    """
+    progress_bar = st.progress(0, text='Préparation des données...')
+
+    def show_progress(progress: list[orders.OrderProgress]):
+        n_done = sum(p.status_code == 201 for p in progress)
+        progress_bar.progress(
+            n_done / len(progress),
+            text=f'Préparation des données... ({n_done}/{len(progress)} '
+                 f'année(s) disponible(s))'
+        )
+
+    # Years retrieved in the background are found in the cache once done,
+    # the orders still in flight are joined with a progress bar
+    for year in years:
+        st.session_state.prefetcher.result(('year', id_station, year),
+                                           timeout=0)
+
+    try:
+        return climatology.get_years(
+            id_station, list(years), opening_date, on_progress=show_progress)
+    finally:
+        progress_bar.empty()
 
 
 def api_parameters_in_selected_category(category: str) -> list:
@@ -286,19 +320,41 @@ def filter_climatological_data(raw_data: pd.DataFrame) -> pd.DataFrame:
         return raw_data[cols_to_keep]
 
 
-def describe_climatological_data(data: pd.DataFrame) -> pd.DataFrame:
-    """Create descriptive statistics for climatological data.
+def default_visualization_year(opening_date: datetime) -> int:
+    """Get the year selected by default for the visualization : the last full
+    year, or the opening year of a station opened this year.
 
     Args:
-        data (pd.DataFrame): data to describe.
+        opening_date (datetime): opening date of the station.
 
     Returns:
-        pd.DataFrame: descriptive statistics.
+        int: year.
     """
-    df = data.iloc[:, 2:].describe().loc[['min', 'max', 'mean', '50%']]
-    df = df.rename(index={'min': 'Minimum','max': 'Maximum','mean': 'Moyenne',
-                          '50%': 'Médiane'})
-    return df
+    return max(opening_date.year, datetime.now().year - 1)
+
+
+def other_date_limits() -> tuple[date, time]:
+    """Get the latest date and time of the observations at another date, the
+    hourly data of a day being available from the end of the morning.
+
+    Returns:
+        tuple[date, time]: latest date and latest time (Paris time) on that
+        date.
+    """
+    now_utc = datetime.now().astimezone(tz=ZoneInfo('UTC'))
+
+    if now_utc.time() < time(11, 45, 0):
+        max_date_value = now_utc.date() - timedelta(days=1)
+    else:
+        max_date_value = now_utc.date()
+
+    time_limit = (
+    datetime(2023, 1, 1, 5, 0, 0, tzinfo=ZoneInfo('UTC'))
+    .astimezone(ZoneInfo('Europe/Paris'))
+    .time()
+    )
+
+    return max_date_value, time_limit
 
 
 # -- Set page config
@@ -310,6 +366,9 @@ st.title('Visualisation de données météo')
 
 # -- Application sidebar
 
+if 'prefetcher' not in st.session_state:
+    st.session_state.prefetcher = prefetch.Prefetcher()
+
 with st.sidebar:
 
     st.markdown('## Sélectionnez une commune')
@@ -322,20 +381,8 @@ with st.sidebar:
     )
 
     # Search for cities from the text input and list the results
-    city_search_response = utils.search_city(st.session_state.city_search)
-    if city_search_response.status_code == requests.codes.ok:
-        city_search_options = []
-        for _ in city_search_response.json().get('features'):
-            city_search_options.append(
-                {
-                'label': _['properties']['label'],
-                'context': _['properties']['context'],
-                'coordinates': _['geometry']['coordinates'][::-1]
-                }
-            )
-    else:
-        city_search_options = []
-        
+    city_search_options = communes.search(st.session_state.city_search)
+
     st.selectbox(
         label='Faites votre choix',
         options=city_search_options,
@@ -349,15 +396,37 @@ with st.sidebar:
         """Remove search and selected city from session state and clear cache."""
         st.session_state.city_search = ''
         st.session_state.selected_city = None
+        st.session_state.prefetcher.cancel()
     
     st.button('Effacer', on_click=del_searched_and_selected_city)
     
     if st.session_state.selected_city:
+        # Modules of the station sections, also used by the functions above
+        import climatology
+        import observations
+        import orders
+        import parsers
+        import utils
+        from meteo_france import Client
+
         st.markdown('## Station météo la plus proche')
 
         st.session_state.nearest_station_info = get_station_info(
             st.session_state.selected_city.get('coordinates'))
 
+        # Start the order of the default year of the page in the background,
+        # cancelling the ones of the previous station. The one of the other
+        # date is started once its form is opened
+        id_station = st.session_state.nearest_station_info.get('id_station')
+        opening_date = st.session_state.nearest_station_info.get('date_ouverture')
+        if st.session_state.prefetcher.select(id_station):
+            st.session_state.prefetcher.submit(
+                ('year', id_station, default_visualization_year(opening_date)),
+                climatology.get_years,
+                id_station, [default_visualization_year(opening_date)],
+                opening_date
+            )
+
         # Display nearest station information in expander
         with st.expander(
             f'''{st.session_state.nearest_station_info.get('nom_usuel')} '''
@@ -408,8 +477,10 @@ if st.session_state.selected_city:
 
     try:
         # Get observation data
-        current_observation, previous_observation = get_observation(
-            st.session_state.nearest_station_info.get('id_station'))
+        nearby_stations = get_nearby_stations(
+            st.session_state.selected_city.get('coordinates'))
+        observation_station_id, current_observation, previous_observation = get_observation(
+            tuple(station['id_station'] for station in nearby_stations))
     except Exception as e:
         st.error(f'''☔ Une erreur est apparue !  
                 {str(e)}
@@ -495,6 +566,15 @@ if st.session_state.selected_city:
                 delta=(f'{(d/100):.0f} hPa') if d is not None else None
             )
         
+        if observation_station_id != st.session_state.nearest_station_info.get('id_station'):
+            observation_station = next(
+                station for station in nearby_stations
+                if station['id_station'] == observation_station_id)
+            st.caption(
+                f'''📡 La station la plus proche ne transmet pas de relevé, '''
+                f'''affichage de celui de la station {observation_station['nom_usuel']} '''
+                f'''({observation_station['distance']:.1f} km).''')
+
         if 'validity_time' in current_observation:
             observation_datetime_utc = datetime.strptime(
                 current_observation.get('validity_time'),
@@ -507,180 +587,177 @@ if st.session_state.selected_city:
 
     st.subheader('Observations à une date antérieure')
 
-    # Layout requested date and time of observation in form widget
-    with st.form('other_date'):
-        st.write('''
-            **Remontez le temps** et afficher le relevé de la station 
-            d'observation **à une date antérieure**.
-        ''')
+    # The form is opened on demand, its default choice being then retrieved
+    # in the background while the user makes their choice
+    if st.toggle('Remonter le temps', key='other_date_opened'):
 
         # Set date and time limit for the selection
-        now = datetime.now()
-        now_utc = datetime.now().astimezone(tz=ZoneInfo('UTC'))
+        max_date_value, time_limit = other_date_limits()
+        prefetch_other_date_observation(
+            st.session_state.nearest_station_info.get('id_station'),
+            max_date_value, time_limit)
+
+        # Layout requested date and time of observation in form widget
+        with st.form('other_date'):
+            st.write('''
+                **Remontez le temps** et afficher le relevé de la station 
+                d'observation **à une date antérieure**.
+            ''')
 
-        if now_utc.time() < time(11, 45, 0):
-            max_date_value = now_utc.date() - timedelta(days=1)
-            date_value = max_date_value
-        else:
-            max_date_value = now_utc.date()
             date_value = max_date_value
 
-        time_limit = (
-        datetime(2023, 1, 1, 5, 0, 0, tzinfo=ZoneInfo('UTC'))
-        .astimezone(ZoneInfo('Europe/Paris'))
-        .time()
-        )
-
-        # Layout date and time selection in date and time input widgets
-        col9, col10 = st.columns(2)
-        with col9:
-            st.date_input(
-                label='Précisez une date...',
-                value=date_value,
-                max_value=max_date_value,
-                key='other_date_selected',
-                format='DD/MM/YYYY'
-            )
-        with col10:
-            st.time_input(
-                label='...et une heure',
-                value=time_limit,
-                step=3600,
-                key='other_time_selected'
-            )
-
-        other_date_validated = st.form_submit_button('Afficher les observations')
-
-
-    if other_date_validated:
-
-        def check_datetime_limit():
-            """Check if selected date and time respect Météo France api rules"""
-            return ((st.session_state.other_date_selected == max_date_value) 
-                    and (st.session_state.other_time_selected > time_limit))
-
-        # Get observation data
-        if not check_datetime_limit():
-            try:
-                dict_other_date = get_other_date_observation(
-                    st.session_state.nearest_station_info.get('id_station'),
-                    st.session_state.other_date_selected,
-                    st.session_state.other_time_selected
+            # Layout date and time selection in date and time input widgets
+            col9, col10 = st.columns(2)
+            with col9:
+                st.date_input(
+                    label='Précisez une date...',
+                    value=date_value,
+                    max_value=max_date_value,
+                    key='other_date_selected',
+                    format='DD/MM/YYYY'
+                )
+            with col10:
+                st.time_input(
+                    label='...et une heure',
+                    value=time_limit,
+                    step=3600,
+                    key='other_time_selected'
                 )
-            except Exception as e:
-                st.error(f'''☔ Une erreur est apparue !  
-                        {str(e)}
-                ''')
-                st.stop()
 
-            if dict_other_date:
-                # Layout observation in metric widgets
-                with st.container(border=True):
-                    col11, col12, col13, col14 = st.columns(4)
-                    with col11:
-                        c = dict_other_date.get('current_observation').get('T')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('T'),
-                            dict_other_date.get('previous_observation').get('T'),
-                            0
-                        )
-                        st.metric(
-                            label='Température',
-                            value=(f'{(c):.1f} °C') if c is not None else None,
-                            delta=(f'{d:.1f} °C') if d is not None else None
-                        )
-                    with col12:
-                        c = dict_other_date.get('current_observation').get('U')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('U'), 
-                            dict_other_date.get('previous_observation').get('U'),
-                            0
-                        )
-                        st.metric(
-                            label='Humidité',
-                            value=(f'{c} %') if c is not None else None,
-                            delta=(f'{d} %') if d is not None else None
-                        )
-                    with col13:
-                        c = dict_other_date.get('current_observation').get('FF')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('FF'),
-                            dict_other_date.get('previous_observation').get('FF'),
-                            0
-                        )
-                        st.metric(
-                            label='Vent',
-                            value=(f'{(c*3.6):.0f} km/h') if c is not None else None,
-                            delta=(f'{(d*3.6):.0f} km/h') if d is not None else None
-                        )
-                    with col14:
-                        c = dict_other_date.get('current_observation').get('RR1')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('RR1'),
-                            dict_other_date.get('previous_observation').get('RR1'),
-                            0
-                        )
-                        st.metric(
-                            label='Précipitations 1h',
-                            value=(f'{c:.1f} mm') if c is not None else None,
-                            delta=(f'{d:.1f} mm') if d is not None else None
-                        )
-
-                    col15, col16, col17, col18 = st.columns(4)
-                    with col15:
-                        c = dict_other_date.get('current_observation').get('VV')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('VV'),
-                            dict_other_date.get('previous_observation').get('VV'),
-                            0
-                        )
-                        st.metric(
-                            label='Visibilité',
-                            value=(f'{(c/1000):.1f} km') if c is not None else None,
-                            delta=(f'{(d/1000):.1f} km') if d is not None else None
-                        )
-                    with col16:
-                        c = dict_other_date.get('current_observation').get('NEIGETOT')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('NEIGETOT'),
-                            dict_other_date.get('previous_observation').get('NEIGETOT'),
-                            0
-                        )
-                        st.metric(
-                            label='Neige',
-                            value=(f'{(c*100):.0f} cm') if c is not None else None,
-                            delta=(f'{(d*100):.0f} cm') if d is not None else None
-                        )
-                    with col17:
-                        c = dict_other_date.get('current_observation').get('INS')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('INS'),
-                            dict_other_date.get('previous_observation').get('INS'),
-                            0
-                        )
-                        st.metric(
-                            label='Ensoleillement',
-                            value=(f'{c} min') if c is not None else None,
-                            delta=(f'{d} min') if d is not None else None
-                        )
-                    with col18:
-                        c = dict_other_date.get('current_observation').get('PSTAT')
-                        d = utils.calculate_delta(
-                            dict_other_date.get('current_observation').get('PSTAT'),
-                            dict_other_date.get('previous_observation').get('PSTAT'),
-                            0.1
-                        )
-                        st.metric(
-                            label='Pression',
-                            value=(f'{(c):.0f} hPa') if c is not None else None,
-                            delta=(f'{(d):.0f} hPa') if d is not None else None
-                        )
+            other_date_validated = st.form_submit_button('Afficher les observations')
+
+
+        if other_date_validated:
+
+            def check_datetime_limit():
+                """Check if selected date and time respect Météo France api rules"""
+                return ((st.session_state.other_date_selected == max_date_value) 
+                        and (st.session_state.other_time_selected > time_limit))
+
+            # Get observation data
+            if not check_datetime_limit():
+                try:
+                    dict_other_date = get_other_date_observation(
+                        st.session_state.nearest_station_info.get('id_station'),
+                        st.session_state.other_date_selected,
+                        st.session_state.other_time_selected
+                    )
+                except Exception as e:
+                    st.error(f'''☔ Une erreur est apparue !  
+                            {str(e)}
+                    ''')
+                    st.stop()
+
+                if dict_other_date:
+                    # Layout observation in metric widgets
+                    with st.container(border=True):
+                        col11, col12, col13, col14 = st.columns(4)
+                        with col11:
+                            c = dict_other_date.get('current_observation').get('T')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('T'),
+                                dict_other_date.get('previous_observation').get('T'),
+                                0
+                            )
+                            st.metric(
+                                label='Température',
+                                value=(f'{(c):.1f} °C') if c is not None else None,
+                                delta=(f'{d:.1f} °C') if d is not None else None
+                            )
+                        with col12:
+                            c = dict_other_date.get('current_observation').get('U')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('U'), 
+                                dict_other_date.get('previous_observation').get('U'),
+                                0
+                            )
+                            st.metric(
+                                label='Humidité',
+                                value=(f'{c} %') if c is not None else None,
+                                delta=(f'{d} %') if d is not None else None
+                            )
+                        with col13:
+                            c = dict_other_date.get('current_observation').get('FF')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('FF'),
+                                dict_other_date.get('previous_observation').get('FF'),
+                                0
+                            )
+                            st.metric(
+                                label='Vent',
+                                value=(f'{(c*3.6):.0f} km/h') if c is not None else None,
+                                delta=(f'{(d*3.6):.0f} km/h') if d is not None else None
+                            )
+                        with col14:
+                            c = dict_other_date.get('current_observation').get('RR1')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('RR1'),
+                                dict_other_date.get('previous_observation').get('RR1'),
+                                0
+                            )
+                            st.metric(
+                                label='Précipitations 1h',
+                                value=(f'{c:.1f} mm') if c is not None else None,
+                                delta=(f'{d:.1f} mm') if d is not None else None
+                            )
+
+                        col15, col16, col17, col18 = st.columns(4)
+                        with col15:
+                            c = dict_other_date.get('current_observation').get('VV')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('VV'),
+                                dict_other_date.get('previous_observation').get('VV'),
+                                0
+                            )
+                            st.metric(
+                                label='Visibilité',
+                                value=(f'{(c/1000):.1f} km') if c is not None else None,
+                                delta=(f'{(d/1000):.1f} km') if d is not None else None
+                            )
+                        with col16:
+                            c = dict_other_date.get('current_observation').get('NEIGETOT')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('NEIGETOT'),
+                                dict_other_date.get('previous_observation').get('NEIGETOT'),
+                                0
+                            )
+                            st.metric(
+                                label='Neige',
+                                value=(f'{(c*100):.0f} cm') if c is not None else None,
+                                delta=(f'{(d*100):.0f} cm') if d is not None else None
+                            )
+                        with col17:
+                            c = dict_other_date.get('current_observation').get('INS')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('INS'),
+                                dict_other_date.get('previous_observation').get('INS'),
+                                0
+                            )
+                            st.metric(
+                                label='Ensoleillement',
+                                value=(f'{c} min') if c is not None else None,
+                                delta=(f'{d} min') if d is not None else None
+                            )
+                        with col18:
+                            c = dict_other_date.get('current_observation').get('PSTAT')
+                            d = utils.calculate_delta(
+                                dict_other_date.get('current_observation').get('PSTAT'),
+                                dict_other_date.get('previous_observation').get('PSTAT'),
+                                0.1
+                            )
+                            st.metric(
+                                label='Pression',
+                                value=(f'{(c):.0f} hPa') if c is not None else None,
+                                delta=(f'{(d):.0f} hPa') if d is not None else None
+                            )
+
+            else:
+                st.warning(f'⏲️ L\'heure sélectionnée est trop récente : elle ne peut '
+                           f'pas dépasser {time_limit:%Hh%M}.')
 
         else:
-            st.warning(f'⏲️ L\'heure sélectionnée est trop récente : elle ne peut '
-                       f'pas dépasser {time_limit:%Hh%M}.')
-            
-    else:
+            st.info(f'👆 Pour afficher les observations désirées, validez votre '
+                    f'choix en cliquant sur le bouton ci-dessus.')
         st.info(f'👆 Pour afficher les observations désirées, validez votre '
                 f'choix en cliquant sur le bouton ci-dessus.')
 
@@ -691,7 +768,7 @@ if st.session_state.selected_city:
     # Layout year selection
     with st.container(border=True):
         st.write('''Visualisez **l'évolution** des **variables** pour 
-                 **l'année** de votre choix.''')
+                 **l'année** ou **la période** de votre choix.''')
         
         # List years from the station opening until now
         select_year_options = list(
@@ -709,17 +786,26 @@ if st.session_state.selected_city:
             """Clear the DataFrame used for visualization, clear the selected 
             category and change button state each time the year changes."""
             st.session_state.climatological_data = pd.DataFrame()
+            st.session_state.climatological_data_key = None
             st.session_state.visualization_button_clicked = False
             st.session_state.selected_category_for_visualization = []
 
-        # Layout year selection in widget
-        st.selectbox(
-            label='Sélectionnez une année',
-            options=select_year_options[::-1],
-            index=1,
+        # Default to the last full year
+        default_year = default_visualization_year(
+            st.session_state.nearest_station_info.get('date_ouverture'))
+
+        # Layout years selection in widget
+        st.select_slider(
+            label='Sélectionnez une année ou une période',
+            options=select_year_options,
+            value=(default_year, default_year),
             on_change=clear_visualization_data,
-            key='year_for_visualization'
+            key='years_for_visualization'
         )
+        first_year, last_year = st.session_state.years_for_visualization
+        selected_years = tuple(range(first_year, last_year+1))
+        selected_years_label = (f'{first_year}' if first_year == last_year
+                                else f'{first_year}-{last_year}')
 
         if 'visualization_button_clicked' not in st.session_state:
             st.session_state.visualization_button_clicked = False
@@ -729,18 +815,25 @@ if st.session_state.selected_city:
 
         st.button('Récupérer les données', on_click=click_visualization_button)
 
-    # Get data for selected year
+    # Get data for selected years, once per station and years
     if st.session_state.visualization_button_clicked:
-        try:
-            st.session_state.climatological_data = get_year_climatological_data(
-                st.session_state.nearest_station_info.get('id_station'),
-                st.session_state.year_for_visualization
-            )
-        except Exception as e:
-            st.error(f'''☔ Une erreur est apparue !  
-                    {str(e)}
-            ''')
-            st.stop()
+        climatological_data_key = (
+            st.session_state.nearest_station_info.get('id_station'),
+            selected_years
+        )
+        if st.session_state.get('climatological_data_key') != climatological_data_key:
+            try:
+                st.session_state.climatological_data = get_years_climatological_data(
+                    st.session_state.nearest_station_info.get('id_station'),
+                    selected_years,
+                    st.session_state.nearest_station_info.get('date_ouverture')
+                )
+                st.session_state.climatological_data_key = climatological_data_key
+            except Exception as e:
+                st.error(f'''☔ Une erreur est apparue !  
+                        {str(e)}
+                ''')
+                st.stop()
 
         # Layout category of variables selection in radio widget
         st.radio(
@@ -767,34 +860,44 @@ if st.session_state.selected_city:
 
         # -- Display yearly evolution in plotly widget
 
-        st.markdown('#### Evolution annuelle')
+        import charts
+        import normals
 
-        # Set type of plot for each category of parameters
-        plot_type_per_category = {
-            'Vent': 'line',
-            'Ensoleillement': 'bar',
-            'Neige': 'bar',
-            'Précipitations': 'bar',
-            'Température': 'line',
-            'Humidité': 'line'
-        }
+        st.markdown('#### Evolution annuelle')
 
-        # Plot evolution in line or bar plot
-        if plot_type_per_category[st.session_state.selected_category_for_visualization] == 'line':
-            fig = px.line(
-                data_to_plot,
-                x='DATE',
-                y=data_to_plot.iloc[:, 2:].columns,
-                labels={'DATE': 'Date', 'value': 'Valeur', 'variable': 'Variable(s)'}
+        # Long series are downsampled to the width of the chart unless the
+        # full resolution is requested to zoom in
+        full_resolution = False
+        if len(data_to_plot.index) > 2 * constants.CHART_WIDTH_PX:
+            full_resolution = st.toggle(
+                'Afficher tous les relevés (plus lent)',
+                key='full_resolution_evolution'
             )
-        if plot_type_per_category[st.session_state.selected_category_for_visualization] == 'bar':
-            fig = px.bar(
-                data_to_plot,
-                x='DATE',
-                y=data_to_plot.iloc[:, 2:].columns,
-                labels={'DATE': 'Date', 'value': 'Valeur', 'variable': 'Variable(s)'}
+
+        # Normals are displayed once computed from enough complete years
+        station_normals = normals.STORE.get(
+            st.session_state.nearest_station_info.get('id_station'))
+        if (station_normals is not None
+                and station_normals['years'].max() < constants.NORMALS_MIN_YEARS):
+            station_normals = None
+
+        plot_type = charts.PLOT_TYPE_PER_CATEGORY[
+            st.session_state.selected_category_for_visualization]
+        show_normals = False
+        if station_normals is not None and plot_type == 'line':
+            show_normals = st.toggle(
+                'Afficher les normales (moyenne et 80 % des années)',
+                key='show_normals'
             )
-        fig.update_layout(legend=dict(x=0, y=1.15, orientation='h'))
+
+        # Plot evolution in line or bar plot
+        fig = charts.evolution_figure(
+            data_to_plot,
+            plot_type,
+            width=None if full_resolution else constants.CHART_WIDTH_PX
+        )
+        if show_normals:
+            charts.add_normals(fig, data_to_plot, station_normals)
 
         if len(fig.data) != 0:
             st.plotly_chart(fig)
@@ -803,8 +906,14 @@ if st.session_state.selected_city:
 
         st.markdown('#### Statistiques descriptives')
 
+        description = climatology.describe_climatological_data(data_to_plot)
+        if station_normals is not None:
+            # Mean departure from the normals of the days
+            description.loc['Ecart à la normale'] = normals.anomalies(
+                data_to_plot, station_normals).iloc[:, 2:].mean()
+
         st.dataframe(
-            describe_climatological_data(data_to_plot).style.format(precision=1),
+            description.style.format(precision=1),
             use_container_width=True
         )
 
@@ -812,33 +921,18 @@ if st.session_state.selected_city:
 
         st.markdown('#### Distribution des variables')
 
-        fig = px.histogram(
-            data_to_plot,
-            x=data_to_plot.iloc[:, 2:].columns,
-            labels={'value': 'Valeur', 'variable': 'Variable(s)'}
-        )
-
-        fig.update_layout(yaxis=dict(title='Fréquence'))
-        fig.update_layout(legend=dict(x=0, y=1.15, orientation='h'))
-        
-        st.plotly_chart(fig)
+        st.plotly_chart(charts.histogram_figure(data_to_plot))
 
         # -- Display data histogram in plotly widget
 
         st.markdown('#### Dispersion des variables')
 
-        fig = px.box(
-            data_to_plot,
-            x=data_to_plot.iloc[:, 2:].columns,
-            labels={'value': 'Valeur', 'variable': 'Variable(s)'}
-        )
-
-        st.plotly_chart(fig)
+        st.plotly_chart(charts.box_figure(data_to_plot))
 
     elif st.session_state.selected_category_for_visualization:
         st.info(
             f'Les données de **« {st.session_state.selected_category_for_visualization} »** '
-            f'ne sont pas disponibles pour l\'année  **{st.session_state.year_for_visualization}**. '
+            f'ne sont pas disponibles pour l\'année  **{selected_years_label}**. '
             f'Sélectionnez une autre année et/ou une autre catégorie.'
         )
                 
@@ -865,4 +959,31 @@ st.caption('''
     Auteur : T. Anquetil ([GitHub](https://github.com/anquetos) & 
            [LinkedIn](https://www.linkedin.com/in/thomas-anquetil-132a73123)) 
            · Février 2024
-''')
\ No newline at end of file
+''')
+
+# -- Display debug panel of the api requests (when the METEOVIZ_DEBUG
+# environment variable is set, the metrics being the ones of every session)
+
+if os.environ.get('METEOVIZ_DEBUG'):
+    from metrics import METRICS
+
+    with st.sidebar:
+        st.markdown('## Requêtes aux API')
+        with st.expander('Afficher les métriques', expanded=True):
+            st.dataframe(
+                pd.DataFrame(METRICS.summary()),
+                hide_index=True,
+                column_config={
+                    'mean_ms': st.column_config.NumberColumn(format='%.0f'),
+                    'p95_ms': st.column_config.NumberColumn(format='%.0f'),
+                    'max_ms': st.column_config.NumberColumn(format='%.0f'),
+                    'kb_received': st.column_config.NumberColumn(format='%.1f')
+                }
+            )
+            st.caption(f'Renouvellements du jeton : {METRICS.token_refreshes}')
+            st.download_button(
+                'Exporter (Prometheus)',
+                data=METRICS.render_prometheus(),
+                file_name='metrics.prom',
+                mime='text/plain'
+            )
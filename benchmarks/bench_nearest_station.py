@@ -0,0 +1,98 @@
+"""
+Compare the nearest station lookup through the spatial index with the previous
+implementation computing the geodesic distance to every station with
+'DataFrame.apply'.
+
+Run from the repository root :
+python benchmarks/bench_nearest_station.py
+"""
+
+from pathlib import Path
+import sys
+import os
+import timeit
+
+import numpy as np
+import pandas as pd
+from geopy import distance
+
+# Make the application modules importable and the relative paths valid
+ROOT = Path(__file__).parent.parent.absolute()
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import constants
+import utils
+
+
+def nearest_station_with_apply(lat_lon: list) -> dict:
+    """Previous implementation of the nearest station lookup.
+
+    Args:
+        lat_lon (list): coordinates to calculate distance from.
+
+    Returns:
+        dict: nearest station information.
+    """
+    df = pd.read_csv(
+        constants.WEATHER_STATION_LIST_PATH,
+        sep=';',
+        dtype={'Id_station': object},
+        parse_dates=['Date_ouverture']
+    )
+
+    df.columns = df.columns.str.lower()
+    df['nom_usuel'] = df['nom_usuel'].str.title()
+    df['distance'] = df.apply(
+        lambda x: distance.distance(
+            [x['latitude'], x['longitude']],
+            lat_lon).km,
+            axis='columns'
+    )
+
+    return df.nsmallest(1, 'distance').to_dict('records')[0]
+
+
+def random_points(n: int, seed: int = 0) -> list[list[float]]:
+    """Draw random coordinates in metropolitan France.
+
+    Args:
+        n (int): number of points ;
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        list[list[float]]: latitudes and longitudes.
+    """
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(42.3, 51.1, n)
+    lon = rng.uniform(-4.8, 8.2, n)
+
+    return [[float(a), float(b)] for a, b in zip(lat, lon)]
+
+
+def main():
+    points = random_points(50)
+
+    # Check that both implementations return the same station
+    for lat_lon in points:
+        expected = nearest_station_with_apply(lat_lon)
+        result = utils._get_nearest_station_information(lat_lon)
+        assert result['id_station'] == expected['id_station'], lat_lon
+        assert abs(result['distance'] - expected['distance']) < 1e-9, lat_lon
+    print(f'Same nearest station for {len(points)} random points.')
+
+    n = 5
+    apply_time = timeit.timeit(
+        lambda: [nearest_station_with_apply(p) for p in points[:n]],
+        number=1) / n
+    index_time = timeit.timeit(
+        lambda: [utils._get_nearest_station_information(p) for p in points],
+        number=3) / (3 * len(points))
+
+    print(f"'apply' lookup : {apply_time * 1000:.2f} ms")
+    print(f'Index lookup   : {index_time * 1000:.3f} ms')
+    print(f'Speed-up       : x{apply_time / index_time:.0f}')
+
+
+if __name__ == '__main__':
+    main()
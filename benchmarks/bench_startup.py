@@ -0,0 +1,103 @@
+"""
+Measure the startup of the application : import cost of its modules and time
+to first paint, the first render of the page without any city selected.
+
+Each measure runs in a new interpreter so that nothing is imported yet, with
+streamlit imported first like in the server process running the script. The
+heavy modules loaded by the first render are listed to spot an import moved
+back to the top of the script.
+
+Run from the repository root :
+python benchmarks/bench_startup.py
+python benchmarks/bench_startup.py --repeat 10
+"""
+
+from pathlib import Path
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+ROOT = Path(__file__).parent.parent.absolute()
+
+# Application modules and the heavy dependencies they load
+MODULES = ['communes', 'prefetch', 'utils', 'stations', 'meteo_france',
+           'observations', 'orders', 'climatology', 'normals', 'charts']
+HEAVY_MODULES = ['plotly.express', 'geopy', 'requests', 'meteo_france', 'charts']
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+import streamlit
+start = time.perf_counter()
+import {module}
+print(json.dumps(time.perf_counter() - start))
+'''
+
+FIRST_PAINT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file('app.py', default_timeout=60).run()
+painted = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({{
+    'first_paint': painted - imported,
+    'rerun': rerun - painted,
+    'exceptions': len(at.exception),
+    'loaded': [m for m in {heavy} if m in sys.modules],
+}}))
+'''
+
+
+def _run(script: str) -> object:
+    """Run a script in a new interpreter from the repository root and decode
+    the json it prints."""
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_cost(module: str, repeat: int) -> float:
+    """Median time to import a module and its dependencies, in seconds."""
+    return statistics.median(
+        _run(IMPORT_SCRIPT.format(module=module)) for _ in range(repeat))
+
+
+def first_paint(repeat: int) -> dict:
+    """Median times of the first render of the page and of a rerun, in
+    seconds, and heavy modules loaded by the first render."""
+    runs = [_run(FIRST_PAINT_SCRIPT.format(heavy=HEAVY_MODULES))
+            for _ in range(repeat)]
+
+    return {
+        'first_paint': statistics.median(r['first_paint'] for r in runs),
+        'rerun': statistics.median(r['rerun'] for r in runs),
+        'exceptions': max(r['exceptions'] for r in runs),
+        'loaded': runs[-1]['loaded'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of runs of each measure')
+    args = parser.parse_args()
+
+    print('Import (après streamlit) :')
+    for module in MODULES:
+        print(f'  {module:<14} {import_cost(module, args.repeat) * 1000:7.1f} ms')
+
+    paint = first_paint(args.repeat)
+    print(f"Premier affichage : {paint['first_paint'] * 1000:7.1f} ms")
+    print(f"Réexécution       : {paint['rerun'] * 1000:7.1f} ms")
+    print(f"Modules lourds chargés : {', '.join(paint['loaded']) or 'aucun'}")
+    if paint['exceptions']:
+        print(f"Erreurs au premier affichage : {paint['exceptions']}")
+
+
+if __name__ == '__main__':
+    main()
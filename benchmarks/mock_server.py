@@ -0,0 +1,613 @@
+"""
+Local stand-in server for the Météo France and Adresse apis.
+
+It implements the endpoints used by the application with synthetic but
+realistic data, so that the code can be exercised and measured without
+credentials nor network access :
+- token endpoint of the Météo France portal ;
+- 'liste-stations' and 'station/horaire' of the observation api (DPObs) ;
+- 'commande-station/quotidienne', 'commande-station/horaire' and
+'commande/fichier' of the climatological api (DPClim), orders going through the
+202 -> 204 -> 201 lifecycle ;
+- 'search' and 'reverse' of the Adresse api.
+
+Latency and errors can be injected. To run the application against it :
+python benchmarks/mock_server.py --port 8765
+METEOVIZ_PORTAL_URL=http://127.0.0.1:8765 \\
+METEOVIZ_API_URL=http://127.0.0.1:8765 \\
+METEOVIZ_ADRESSE_URL=http://127.0.0.1:8765 streamlit run app.py
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+import argparse
+import json
+import random
+import threading
+import time
+import unicodedata
+import uuid
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).parent.parent.absolute()
+STATION_LIST_PATH = ROOT / 'datasets' / 'weather-stations-list.csv'
+DAILY_PARAMETERS_PATH = ROOT / 'datasets' / 'api-clim-table-parametres-quotidiens.csv'
+
+HOURLY_PARAMETERS = ['RR1', 'T', 'TN', 'TX', 'U', 'DD', 'FF', 'FXI', 'VV',
+                     'NEIGETOT', 'INS', 'PSTAT', 'PMER']
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class MockConfig(object):
+    """Behaviour of the mock server.
+
+    Args:
+        latency (float, optional): delay added to each response in seconds ;
+        jitter (float, optional): random extra delay up to this value ;
+        error_rate (float, optional): probability to answer with an error ;
+        error_statuses (tuple[int], optional): status codes of the errors ;
+        pending_polls (int, optional): number of 204 answers before an order
+        file is ready ;
+        token_lifetime (int, optional): token validity in seconds ;
+        seed (int, optional): random seed of the errors and data.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_statuses: tuple = (500, 503),
+                 pending_polls: int = 2, token_lifetime: int = 3600,
+                 seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.pending_polls = pending_polls
+        self.token_lifetime = token_lifetime
+        self.seed = seed
+
+
+def _fold(text: str) -> str:
+    """Lowercase and remove accents for search matching."""
+    text = unicodedata.normalize('NFKD', text)
+
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def _comma_csv(df: pd.DataFrame) -> str:
+    """Format a DataFrame like the DPClim files : semicolon separated values
+    with comma decimals."""
+    return df.to_csv(sep=';', index=False, decimal=',', float_format='%.1f')
+
+
+def daily_climatology_csv(id_station: str, start: datetime, end: datetime,
+                          seed: int = 0) -> str:
+    """Generate a daily climatological data file.
+
+    Args:
+        id_station (str): station id number ;
+        start (datetime): first day ;
+        end (datetime): last day ;
+        seed (int, optional): random seed.
+
+    Returns:
+        str: content of the csv file.
+    """
+    rng = np.random.default_rng([seed, int(id_station)])
+    dates = pd.date_range(start.date(), end.date(), freq='D')
+    n = len(dates)
+    season = np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 110) / 365.25)
+
+    parameters = pd.read_csv(DAILY_PARAMETERS_PATH, sep=';')
+    # Every station doesn't measure every parameter
+    measured = set(parameters['parameter'].sample(
+        frac=0.6, random_state=int(rng.integers(1 << 31))))
+    measured |= {'RR', 'TN', 'TX', 'TM', 'UM', 'FFM', 'FXI'}
+
+    tm = 12 + 8 * season + rng.normal(0, 2.5, n)
+    amplitude = np.abs(rng.normal(9, 3, n))
+    um = np.clip(75 - 10 * season + rng.normal(0, 8, n), 20, 100)
+    ffm = np.abs(rng.gamma(2.5, 1.4, n))
+    rr = np.where(rng.random(n) < 0.55, 0.0, rng.gamma(0.8, 6, n))
+
+    values = {
+        'TM': tm, 'TMNX': tm, 'TNTXM': tm,
+        'TN': tm - amplitude / 2, 'TX': tm + amplitude / 2,
+        'TN50': tm - amplitude / 2 - 1, 'TNSOL': tm - amplitude / 2 - 2,
+        'TAMPLI': amplitude,
+        'UM': um, 'UN': np.clip(um - 20, 5, 100), 'UX': np.clip(um + 15, 0, 100),
+        'FFM': ffm, 'FXY': ffm * 1.8, 'FXI': ffm * 2.6, 'FF2M': ffm * 0.7,
+        'RR': rr, 'DRR': np.where(rr > 0, rr * 40, 0),
+        'INST': np.clip(360 + 240 * season + rng.normal(0, 150, n), 0, 900),
+        'NEIGETOTX': np.where(tm < 0, rng.gamma(1, 5, n), 0),
+        'PMERM': 1015 + rng.normal(0, 8, n),
+    }
+
+    df = pd.DataFrame({'POSTE': int(id_station),
+                       'DATE': dates.strftime('%Y%m%d').astype(int)})
+    for row in parameters.itertuples():
+        if row.parameter in values:
+            column = np.round(values[row.parameter], 1)
+        elif row.unit == 'bool':
+            column = (rng.random(n) < 0.05).astype(float)
+        elif row.unit == 'hhmm':
+            column = rng.integers(0, 24, n) * 100 + rng.integers(0, 60, n)
+            column = column.astype(float)
+        else:
+            column = np.round(rng.gamma(2, 10, n), 1)
+
+        if row.parameter not in measured:
+            column = np.full(n, np.nan)
+        else:
+            # A few missing values
+            column = np.where(rng.random(n) < 0.02, np.nan, column)
+
+        df[row.parameter] = column
+        df['Q' + row.parameter] = pd.array(
+            np.where(np.isnan(column), pd.NA, 1), dtype='Int8')
+
+    return _comma_csv(df)
+
+
+def hourly_climatology_csv(id_station: str, start: datetime, end: datetime,
+                           seed: int = 0) -> str:
+    """Generate an hourly climatological data file.
+
+    Args:
+        id_station (str): station id number ;
+        start (datetime): first hour ;
+        end (datetime): last hour (included) ;
+        seed (int, optional): random seed.
+
+    Returns:
+        str: content of the csv file.
+    """
+    rng = np.random.default_rng([seed, int(id_station), 1])
+    dates = pd.date_range(start.replace(tzinfo=None),
+                          end.replace(tzinfo=None), freq='h')
+    n = len(dates)
+    season = np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 110) / 365.25)
+    day = np.sin(2 * np.pi * (dates.hour.to_numpy() - 9) / 24)
+
+    t = 12 + 8 * season + 4 * day + rng.normal(0, 1.5, n)
+    values = {
+        'RR1': np.where(rng.random(n) < 0.9, 0.0, rng.gamma(0.7, 1.5, n)),
+        'T': t, 'TN': t - 0.5, 'TX': t + 0.5,
+        'U': np.clip(75 - 15 * day + rng.normal(0, 6, n), 15, 100),
+        'DD': rng.integers(0, 36, n) * 10.0,
+        'FF': np.abs(rng.gamma(2.5, 1.4, n)),
+        'FXI': np.abs(rng.gamma(2.5, 3.5, n)),
+        'VV': np.clip(rng.normal(25000, 10000, n), 100, 75000),
+        'NEIGETOT': np.where(t < 0, rng.gamma(1, 3, n), 0),
+        'INS': np.where(day > 0, rng.integers(0, 61, n), 0).astype(float),
+        'PSTAT': 1000 + rng.normal(0, 8, n),
+        'PMER': 1015 + rng.normal(0, 8, n),
+    }
+
+    df = pd.DataFrame({'POSTE': int(id_station),
+                       'DATE': dates.strftime('%Y%m%d%H').astype(int)})
+    for parameter in HOURLY_PARAMETERS:
+        df[parameter] = np.round(values[parameter], 1)
+        df['Q' + parameter] = 1
+
+    return _comma_csv(df)
+
+
+def hourly_observation(station: dict, validity_time: datetime,
+                       seed: int = 0) -> dict:
+    """Generate an observation of the 'station/horaire' endpoint.
+
+    Args:
+        station (dict): station information ;
+        validity_time (datetime): hour of the observation ;
+        seed (int, optional): random seed.
+
+    Returns:
+        dict: observation with the values in SI units.
+    """
+    rng = np.random.default_rng(
+        [seed, int(station['Id_station']), int(validity_time.timestamp())])
+    now = datetime.now(timezone.utc)
+
+    return {
+        'lat': station['Latitude'],
+        'lon': station['Longitude'],
+        'geo_id_insee': station['Id_station'],
+        'reference_time': now.strftime(DATETIME_FORMAT),
+        'insert_time': now.strftime(DATETIME_FORMAT),
+        'validity_time': validity_time.strftime(DATETIME_FORMAT),
+        't': round(285 + rng.normal(0, 5), 2),
+        'td': round(280 + rng.normal(0, 4), 2),
+        'u': int(rng.integers(30, 100)),
+        'dd': int(rng.integers(0, 36)) * 10,
+        'ff': round(abs(rng.normal(4, 2)), 1),
+        'rr1': round(float(rng.choice([0, 0, 0, 0.2, 1.4])), 1),
+        'vv': int(rng.integers(2000, 50000)),
+        'sss': round(float(rng.choice([0, 0, 0, 0.05])), 2),
+        'insolh': int(rng.integers(0, 61)),
+        'pres': int(101300 + rng.normal(0, 800)),
+        'pmer': int(101500 + rng.normal(0, 800)),
+    }
+
+
+class MockState(object):
+    """Data and bookkeeping shared by the request handlers."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.orders = {}
+        self.calls = Counter()
+
+        self.station_list_text = STATION_LIST_PATH.read_text(encoding='utf-8')
+        stations = pd.read_csv(STATION_LIST_PATH, sep=';',
+                               dtype={'Id_station': object})
+        self.stations = {s['Id_station']: s
+                         for s in stations.to_dict('records')}
+        self.municipalities = self._municipalities(stations)
+
+
+    @staticmethod
+    def _municipalities(stations: pd.DataFrame) -> pd.DataFrame:
+        """Derive municipalities from the stations names and places."""
+        df = pd.DataFrame({
+            'name': (stations['Nom_usuel'].str.split('[_-]', regex=True).str[0]
+                     .str.title()),
+            'department': stations['Id_station'].str[:2],
+            'lat': stations['Latitude'],
+            'lon': stations['Longitude'],
+        })
+        df = df.drop_duplicates('name').reset_index(drop=True)
+        df['citycode'] = df['department'] + (df.index % 1000).map('{:03d}'.format)
+        df['context'] = df['department'] + ', ' + df['name']
+        df['folded'] = df['name'].map(_fold)
+
+        return df
+
+
+    def municipality_feature(self, row, score: float = 1.0) -> dict:
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [row.lon, row.lat]},
+            'properties': {
+                'label': row.name,
+                'score': score,
+                'id': row.citycode,
+                'type': 'municipality',
+                'name': row.name,
+                'postcode': row.department + '000',
+                'citycode': row.citycode,
+                'city': row.name,
+                'context': row.context,
+            }
+        }
+
+
+    def issue_token(self) -> dict:
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = time.monotonic() + self.config.token_lifetime
+
+        return {'access_token': token, 'scope': 'default',
+                'token_type': 'Bearer',
+                'expires_in': self.config.token_lifetime}
+
+
+    def token_is_valid(self, authorization: str | None) -> bool:
+        if not authorization or not authorization.startswith('Bearer '):
+            return False
+        expires_at = self.tokens.get(authorization[len('Bearer '):])
+
+        return expires_at is not None and time.monotonic() < expires_at
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MeteoVizMock/1.0'
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+    def _send(self, status: int, body: str | bytes | dict | list,
+              content_type: str = 'application/json'):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def _delay_and_maybe_fail(self, endpoint: str) -> bool:
+        """Apply the configured latency and error injection.
+
+        Returns:
+            bool: True if an error response has been sent.
+        """
+        config = self.state.config
+        with self.state.lock:
+            self.state.calls[endpoint] += 1
+            jitter = self.state.random.uniform(0, config.jitter)
+            fail = self.state.random.random() < config.error_rate
+            status = self.state.random.choice(config.error_statuses)
+        time.sleep(config.latency + jitter)
+
+        if fail:
+            body = {'code': str(status), 'message': 'Injected error',
+                            'description': 'Erreur injectée par le serveur local'}
+            self._send(status, body)
+
+        return fail
+
+
+    def _check_token(self) -> bool:
+        if self.state.token_is_valid(self.headers.get('Authorization')):
+            return True
+        self._send(401, {
+            'code': '900901',
+            'message': 'Invalid Credentials',
+            'description': 'Invalid JWT token. Make sure you have provided '
+                           'the correct security credentials'
+        })
+
+        return False
+
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        if path != '/token':
+            return self._send(404, {'description': 'Not found'})
+        if self._delay_and_maybe_fail('token'):
+            return
+        if not self.headers.get('Authorization', '').startswith('Basic '):
+            return self._send(401, {'error': 'invalid_client'})
+
+        self._send(200, self.state.issue_token())
+
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        routes = {
+            '/public/DPObs/v1/liste-stations': ('liste-stations', True, self.station_list),
+            '/public/DPObs/v1/station/horaire': ('station/horaire', True, self.observation),
+            '/public/DPClim/v1/commande-station/quotidienne': ('commande-station/quotidienne', True, self.order_daily),
+            '/public/DPClim/v1/commande-station/horaire': ('commande-station/horaire', True, self.order_hourly),
+            '/public/DPClim/v1/commande/fichier': ('commande/fichier', True, self.order_file),
+            '/search/': ('search', False, self.search),
+            '/reverse/': ('reverse', False, self.reverse),
+        }
+        if url.path not in routes:
+            return self._send(404, {'description': 'Not found'})
+
+        endpoint, needs_token, handler = routes[url.path]
+        if self._delay_and_maybe_fail(endpoint):
+            return
+        if needs_token and not self._check_token():
+            return
+        handler(query)
+
+
+    def station_list(self, query: dict):
+        self._send(200, self.state.station_list_text, 'text/csv; charset=utf-8')
+
+
+    def observation(self, query: dict):
+        station = self.state.stations.get(query.get('id_station'))
+        if station is None:
+            return self._send(404, {'description': 'Station inconnue'})
+
+        if query.get('date'):
+            validity_time = datetime.strptime(
+                query['date'], DATETIME_FORMAT).replace(tzinfo=timezone.utc)
+        else:
+            validity_time = (datetime.now(timezone.utc) - timedelta(hours=1)
+                             ).replace(minute=0, second=0, microsecond=0)
+        self._send(200, [hourly_observation(station, validity_time,
+                                            self.state.config.seed)])
+
+
+    def _order(self, query: dict, generator):
+        id_station = query.get('id-station')
+        if id_station not in self.state.stations:
+            return self._send(404, {'description': 'Station inconnue'})
+        try:
+            start = datetime.strptime(query['date-deb-periode'], DATETIME_FORMAT)
+            end = datetime.strptime(query['date-fin-periode'], DATETIME_FORMAT)
+        except (KeyError, ValueError):
+            return self._send(400, {'description': 'Période invalide'})
+
+        order_id = str(self.state.random.randrange(10**11, 10**12))
+        with self.state.lock:
+            self.state.orders[order_id] = {
+                'polls': 0,
+                'content': lambda: generator(id_station, start, end,
+                                             self.state.config.seed)
+            }
+        self._send(202, {'elaboreProduitAvecDemandeResponse': {'return': order_id}})
+
+
+    def order_daily(self, query: dict):
+        self._order(query, daily_climatology_csv)
+
+
+    def order_hourly(self, query: dict):
+        self._order(query, hourly_climatology_csv)
+
+
+    def order_file(self, query: dict):
+        with self.state.lock:
+            order = self.state.orders.get(query.get('id-cmde'))
+            if order is not None:
+                order['polls'] += 1
+        if order is None:
+            return self._send(404, {'description': 'Commande inconnue'})
+
+        if order['polls'] <= self.state.config.pending_polls:
+            # Production pending : empty response
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self._send(201, order['content'](), 'text/csv; charset=utf-8')
+
+
+    def search(self, query: dict):
+        q = _fold(query.get('q', '')).strip()
+        limit = int(query.get('limit', 5))
+        if len(q) < 3:
+            return self._send(400, {'code': 400, 'message': 'q must contain '
+                                    'between 3 and 200 chars'})
+
+        df = self.state.municipalities
+        matches = df[df['folded'].str.startswith(q)]
+        if len(matches) < limit:
+            others = df[df['folded'].str.contains(q, regex=False)
+                        & ~df.index.isin(matches.index)]
+            matches = pd.concat([matches, others])
+        features = [self.state.municipality_feature(row, 0.9)
+                    for row in matches.head(limit).itertuples()]
+
+        self._send(200, {'type': 'FeatureCollection', 'version': 'draft',
+                         'features': features, 'query': query.get('q')})
+
+
+    def reverse(self, query: dict):
+        try:
+            lat = float(query['lat'])
+            lon = float(query['lon'])
+        except (KeyError, ValueError):
+            return self._send(400, {'code': 400, 'message': 'lat/lon invalides'})
+
+        df = self.state.municipalities
+        d2 = (df['lat'] - lat) ** 2 + ((df['lon'] - lon) * np.cos(np.radians(lat))) ** 2
+        nearest = df.loc[[d2.idxmin()]] if d2.min() < 0.05 else df.iloc[:0]
+        features = [self.state.municipality_feature(row)
+                    for row in nearest.itertuples()]
+
+        self._send(200, {'type': 'FeatureCollection', 'version': 'draft',
+                         'features': features})
+
+
+class MockServer(object):
+    """Mock server running in a background thread.
+
+    It can be used as a context manager :
+    with MockServer(MockConfig(latency=0.05)) as server:
+        os.environ['METEOVIZ_API_URL'] = server.base_url
+    """
+
+    def __init__(self, config: MockConfig | None = None,
+                 host: str = '127.0.0.1', port: int = 0,
+                 verbose: bool = False):
+        self.config = config or MockConfig()
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = MockState(self.config)
+        self.httpd.verbose = verbose
+        self._thread = None
+
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+
+        return f'http://{host}:{port}'
+
+
+    @property
+    def calls(self) -> Counter:
+        """Number of requests received per endpoint."""
+        return self.httpd.state.calls
+
+
+    def environ(self) -> dict:
+        """Environment variables pointing the application to this server."""
+        return {
+            'METEOVIZ_PORTAL_URL': self.base_url,
+            'METEOVIZ_API_URL': self.base_url,
+            'METEOVIZ_ADRESSE_URL': self.base_url,
+        }
+
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name='mock-server', daemon=True)
+        self._thread.start()
+
+        return self
+
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='delay added to each response in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra delay up to this value in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='probability to answer with an error')
+    parser.add_argument('--error-statuses', default='500,503',
+                        help='comma separated status codes of the errors')
+    parser.add_argument('--pending-polls', type=int, default=2,
+                        help='number of 204 answers before an order is ready')
+    parser.add_argument('--token-lifetime', type=int, default=3600,
+                        help='token validity in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(',')],
+        pending_polls=args.pending_polls,
+        token_lifetime=args.token_lifetime,
+        seed=args.seed
+    )
+    server = MockServer(config, args.host, args.port, args.verbose)
+    print(f'Serveur local démarré sur {server.base_url}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""
+Benchmark suite of the application hot paths.
+
+Each benchmark is timed several times and the results are saved in a json file
+(one per run, named after the date and the git commit) so that two runs can be
+compared.
+
+Run from the repository root :
+python benchmarks/run_benchmarks.py
+python benchmarks/run_benchmarks.py --only parse
+python benchmarks/run_benchmarks.py --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+ROOT = Path(__file__).parent.parent.absolute()
+RESULTS_FOLDER = ROOT / 'benchmarks' / 'results'
+
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+os.chdir(ROOT)
+
+from mock_server import (MockConfig, MockServer, daily_climatology_csv,
+                         hourly_climatology_csv)
+
+# The application modules read the api urls at import time
+_server = MockServer(MockConfig(pending_polls=1)).start()
+os.environ.update(_server.environ())
+
+import pandas as pd
+import numpy as np
+
+import stations
+import climatology
+import constants
+import charts
+import meteo_france
+import orders
+import parsers
+import ratelimit
+from meteo_france import Client
+
+# The clients measured are not throttled, the rate limiter is timed on its own
+meteo_france.RATE_LIMITER = ratelimit.RateLimiter({}, ratelimit.MemoryBuckets())
+
+STATION = '75106001'
+BENCHMARKS = {}
+
+
+def benchmark(name: str, repeat: int = 5):
+    """Register a benchmark. The decorated function prepares the data and
+    returns the callable to time."""
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        BENCHMARKS[name] = (setup, repeat)
+        return setup
+
+    return decorator
+
+
+def _daily_text(years: int) -> str:
+    return daily_climatology_csv(
+        STATION, datetime(2023 - years + 1, 1, 1), datetime(2023, 12, 31))
+
+
+def _daily_data(years: int, category: str = 'Température') -> pd.DataFrame:
+    """Daily data of a category like the ones plotted by the application."""
+    df = parsers.parse_daily(_daily_text(years))
+    parameters = parsers.daily_parameters()
+    columns = parameters.loc[parameters['parameter_category'] == category,
+                             'parameter']
+
+    return df[['POSTE', 'DATE'] + [c for c in columns if c in df.columns]]
+
+
+@benchmark('nearest_station', repeat=7)
+def bench_nearest_station():
+    rng = np.random.default_rng(0)
+    points = np.column_stack((rng.uniform(42.3, 51.1, 20),
+                              rng.uniform(-4.8, 8.2, 20))).tolist()
+    catalogue = stations.get_catalogue()
+
+    return lambda: [catalogue.nearest(p) for p in points]
+
+
+@benchmark('station_sidecar_load')
+def bench_station_sidecar_load():
+    # Loaded from the Parquet sidecar of the stations list, written if needed
+    stations.StationCatalogue()
+    return stations.StationCatalogue
+
+
+@benchmark('station_csv_parse')
+def bench_station_csv_parse():
+    content = Path(constants.WEATHER_STATION_LIST_PATH).read_bytes()
+    return lambda: stations.parse_station_list(io.BytesIO(content))
+
+
+@benchmark('parse_daily_1y')
+def bench_parse_daily_1y():
+    text = _daily_text(1)
+    return lambda: parsers.parse_daily(text, parsers.categorized_parameters())
+
+
+@benchmark('parse_daily_10y')
+def bench_parse_daily_10y():
+    text = _daily_text(10)
+    return lambda: parsers.parse_daily(text, parsers.categorized_parameters())
+
+
+@benchmark('describe_10y')
+def bench_describe_10y():
+    data = _daily_data(10)
+    return lambda: climatology.describe_climatological_data(data)
+
+
+@benchmark('figure_line_1y')
+def bench_figure_line_1y():
+    data = _daily_data(1)
+    return lambda: charts.evolution_figure(data, 'line')
+
+
+@benchmark('figure_line_10y')
+def bench_figure_line_10y():
+    data = _daily_data(10)
+    return lambda: charts.evolution_figure(data, 'line')
+
+
+@benchmark('figure_bar_10y')
+def bench_figure_bar_10y():
+    data = _daily_data(10, 'Précipitations')
+    return lambda: charts.evolution_figure(data, 'bar')
+
+
+@benchmark('figure_line_hourly_1y')
+def bench_figure_line_hourly_1y():
+    data = parsers.parse_hourly(hourly_climatology_csv(
+        STATION, datetime(2023, 1, 1), datetime(2023, 12, 31, 23)))
+    data = data[['POSTE', 'DATE', 'T', 'TN', 'TX']]
+    # Serialization is part of the cost of sending the figure
+    return lambda: charts.evolution_figure(data, 'line').to_json()
+
+
+@benchmark('order_cycle', repeat=3)
+def bench_order_cycle():
+    client = Client()
+    # Poll without waiting to measure the client overhead only
+    retriever = orders.OrderRetriever(client, schedule=lambda: itertools.repeat(0))
+
+    def cycle():
+        response = retriever.order(
+            lambda: client.order_daily_climatological_data(
+                STATION, '2023-01-01T00:00:00Z', '2023-12-31T00:00:00Z'))
+        return parsers.parse_daily(
+            response.text, parsers.categorized_parameters())
+
+    return cycle
+
+
+def _rate_limiter(buckets) -> Callable[[], object]:
+    # Budgets high enough for the requests never to wait
+    limiter = ratelimit.RateLimiter(
+        {'DPClim': 1e9, 'DPClim/commande/fichier': 1e9}, buckets, burst=1e9)
+    url = f'{constants.ORDER_RECOVERY_URL}?id-cmde=1'
+
+    return lambda: [limiter.acquire(url) for _ in range(1000)]
+
+
+@benchmark('rate_limiter_memory')
+def bench_rate_limiter_memory():
+    return _rate_limiter(ratelimit.MemoryBuckets())
+
+
+@benchmark('rate_limiter_sqlite', repeat=3)
+def bench_rate_limiter_sqlite():
+    path = Path(tempfile.mkdtemp()) / 'buckets.sqlite'
+    return _rate_limiter(ratelimit.SQLiteBuckets(str(path)))
+
+
+def run(names: list[str]) -> dict:
+    """Run the benchmarks and collect their timings in seconds."""
+    results = {}
+    for name in names:
+        setup, repeat = BENCHMARKS[name]
+        func = setup()
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(1, number // 5)
+        times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+        results[name] = {
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'repeat': repeat,
+            'number': number,
+        }
+        print(f'{name:<20} {results[name]["median"] * 1000:>10.3f} ms')
+
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save(results: dict, output: Path | None = None) -> Path:
+    """Save the results with the context of the run in a json file."""
+    commit = git_commit()
+    now = datetime.now()
+    if output is None:
+        RESULTS_FOLDER.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_FOLDER / f'{now:%Y%m%d-%H%M%S}-{commit}.json'
+
+    content = {
+        'commit': commit,
+        'date': now.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': results,
+    }
+    output.write_text(json.dumps(content, indent=2), encoding='utf-8')
+
+    return output
+
+
+def compare(baseline: Path, candidate: Path):
+    """Print the median ratio of each benchmark between two runs."""
+    old = json.loads(baseline.read_text(encoding='utf-8'))
+    new = json.loads(candidate.read_text(encoding='utf-8'))
+    print(f'{"benchmark":<20} {old["commit"]:>12} {new["commit"]:>12}   ratio')
+    for name, result in new['results'].items():
+        if name not in old['results']:
+            continue
+        before = old['results'][name]['median']
+        after = result['median']
+        print(f'{name:<20} {before * 1000:>10.3f}ms {after * 1000:>10.3f}ms '
+              f'  x{after / before:.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--only', nargs='*', default=[],
+                        help='run the benchmarks whose name contains a word')
+    parser.add_argument('--output', type=Path,
+                        help='json file of the results')
+    parser.add_argument('--compare', nargs=2, type=Path,
+                        metavar=('BASELINE', 'CANDIDATE'),
+                        help='compare two json files of results')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    names = [name for name in BENCHMARKS
+             if not args.only or any(word in name for word in args.only)]
+    # Keep the disk cache of the application out of the measures
+    with tempfile.TemporaryDirectory() as folder:
+        climatology.CACHE.folder = Path(folder)
+        results = run(names)
+    print(f'Résultats enregistrés dans {save(results, args.output)}')
+    _server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Plotly figures of the climatological data displayed in the application."""
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import constants
+import downsampling
+import normals as normals_module
+
+# Type of plot for each category of parameters
+PLOT_TYPE_PER_CATEGORY = {
+    'Vent': 'line',
+    'Ensoleillement': 'bar',
+    'Neige': 'bar',
+    'Précipitations': 'bar',
+    'Température': 'line',
+    'Humidité': 'line'
+}
+
+
+def evolution_figure(data: pd.DataFrame, plot_type: str,
+                     width: int | None = constants.CHART_WIDTH_PX,
+                     method: str = 'minmax') -> go.Figure:
+    """Plot the evolution of the variables in a line or bar plot, downsampled
+    to the width of the chart.
+
+    Args:
+        data (pd.DataFrame): data with 'POSTE' and 'DATE' as first columns ;
+        plot_type (str): 'line' or 'bar' ;
+        width (int | None, optional): width of the chart in pixels, all the
+        points are plotted if None ;
+        method (str, optional): downsampling method, 'minmax' or 'lttb'.
+
+    Returns:
+        go.Figure: evolution plot.
+    """
+    plot = px.line if plot_type == 'line' else px.bar
+    labels = {'DATE': 'Date', 'value': 'Valeur', 'variable': 'Variable(s)'}
+
+    if width is not None and len(data.index) > 2 * width:
+        fig = plot(
+            downsampling.downsample(data, width, method),
+            x='DATE',
+            y='value',
+            color='variable',
+            labels=labels
+        )
+    else:
+        fig = plot(
+            data,
+            x='DATE',
+            y=data.iloc[:, 2:].columns,
+            labels=labels
+        )
+    fig.update_layout(legend=dict(x=0, y=1.15, orientation='h'))
+
+    return fig
+
+
+def add_normals(fig: go.Figure, data: pd.DataFrame, normals: pd.DataFrame,
+                width: int = constants.CHART_WIDTH_PX):
+    """Overlay on an evolution plot the band between the 10th and 90th
+    percentiles and the mean of the normals of each variable.
+
+    Args:
+        fig (go.Figure): evolution plot ;
+        data (pd.DataFrame): plotted data with 'POSTE' and 'DATE' as first
+        columns ;
+        normals (pd.DataFrame): normals of the station ;
+        width (int, optional): width of the chart in pixels, the normals being
+        smooth a point every few days is enough for long periods.
+    """
+    dates = pd.DatetimeIndex(data['DATE'].drop_duplicates().sort_values())
+    dates = dates[::max(1, len(dates) // width)]
+    days = normals_module.day_of_year(dates) - 1
+
+    for column in data.columns[2:]:
+        parameter = normals.loc[normals['parameter'] == column].sort_values('DAY')
+        if parameter.empty:
+            continue
+        name = f'{column} normale'
+        fig.add_trace(go.Scatter(
+            x=dates, y=parameter['p10'].to_numpy()[days],
+            mode='lines', line=dict(width=0), showlegend=False,
+            legendgroup=name, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(
+            x=dates, y=parameter['p90'].to_numpy()[days],
+            mode='lines', line=dict(width=0), fill='tonexty',
+            fillcolor='rgba(128, 128, 128, 0.2)', showlegend=False,
+            legendgroup=name, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(
+            x=dates, y=parameter['mean'].to_numpy()[days],
+            mode='lines', line=dict(dash='dot', color='gray'), name=name,
+            legendgroup=name))
+
+
+def histogram_figure(data: pd.DataFrame) -> go.Figure:
+    """Plot the distribution of the variables in a histogram.
+
+    Args:
+        data (pd.DataFrame): data with 'POSTE' and 'DATE' as first columns.
+
+    Returns:
+        go.Figure: histogram.
+    """
+    fig = px.histogram(
+        data,
+        x=data.iloc[:, 2:].columns,
+        labels={'value': 'Valeur', 'variable': 'Variable(s)'}
+    )
+
+    fig.update_layout(yaxis=dict(title='Fréquence'))
+    fig.update_layout(legend=dict(x=0, y=1.15, orientation='h'))
+
+    return fig
+
+
+def box_figure(data: pd.DataFrame) -> go.Figure:
+    """Plot the dispersion of the variables in a box plot.
+
+    Args:
+        data (pd.DataFrame): data with 'POSTE' and 'DATE' as first columns.
+
+    Returns:
+        go.Figure: box plot.
+    """
+    return px.box(
+        data,
+        x=data.iloc[:, 2:].columns,
+        labels={'value': 'Valeur', 'variable': 'Variable(s)'}
+    )
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
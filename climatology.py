@@ -0,0 +1,207 @@
+"""
+Retrieval of the daily climatological data of a station for one or several
+years.
+
+Each year is ordered separately so that it can be cached on disk on its own.
+Orders for the missing years are placed and polled concurrently by the order
+worker threads, then merged in a single frame indexed by date. A stale year
+in the cache (the current one) is completed by ordering only the days since
+its last stored date, with a few days before to reconcile the late rows.
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable
+import threading
+
+import pandas as pd
+
+import constants
+import normals
+import orders
+import parsers
+from meteo_france import Client
+from climatology_cache import CACHE, compact
+
+
+def year_period(year: int, opening_date: datetime) -> tuple[str, str]:
+    """Define the period to order for a year, starting at the station opening
+    if it opened during that year.
+
+    Args:
+        year (int): requested year ;
+        opening_date (datetime): opening date of the station.
+
+    Returns:
+        tuple[str, str]: start and end dates of the period (ISO 8601 format
+        with TZ UTC AAAA-MM-JJThh:00:00Z).
+    """
+    if year == opening_date.year:
+        start_date = f'{opening_date:%Y-%m-%d}T00:00:00Z'
+    else:
+        start_date = f'{year}-01-01T00:00:00Z'
+    # Define the end datetime (if selected year is the current year we probably
+    # can't end the period at end of December)
+    if year == datetime.now().year:
+        end_date = (datetime.now() - constants.CLIMATOLOGY_AVAILABILITY_DELAY
+                    ).strftime('%Y-%m-%dT00:00:00Z')
+    else:
+        end_date = f'{year}-12-31T00:00:00Z'
+
+    return start_date, end_date
+
+
+def incremental_period(year: int, opening_date: datetime,
+                       last_date: datetime) -> tuple[str, str] | None:
+    """Define the period to order to complete the stored data of a year.
+
+    Args:
+        year (int): requested year ;
+        opening_date (datetime): opening date of the station ;
+        last_date (datetime): last date of the stored data.
+
+    Returns:
+        tuple[str, str] | None: start and end dates of the period (ISO 8601
+        format with TZ UTC AAAA-MM-JJThh:00:00Z) or None if the stored data
+        are up to date.
+    """
+    start_date, end_date = year_period(year, opening_date)
+    since = last_date - timedelta(days=constants.CLIMATOLOGY_RECONCILE_DAYS)
+    # Dates in the same ISO format compare in chronological order
+    start_date = max(start_date, f'{since:%Y-%m-%d}T00:00:00Z')
+    if last_date.strftime('%Y-%m-%dT00:00:00Z') >= end_date:
+        return None
+
+    return start_date, end_date
+
+
+def merge_update(stored: pd.DataFrame, update: pd.DataFrame,
+                 since: datetime) -> pd.DataFrame:
+    """Complete stored data with the data ordered since a date, which replace
+    the stored rows from that date.
+
+    Args:
+        stored (pd.DataFrame): stored data ;
+        update (pd.DataFrame): data ordered since the date ;
+        since (datetime): start date of the update.
+
+    Returns:
+        pd.DataFrame: merged data.
+    """
+    df = pd.concat([stored[stored['DATE'] < since], update], ignore_index=True)
+    # Parameters missing from one of the frames are filled with NaN
+    values = df.columns.difference(['POSTE', 'DATE'])
+
+    return df.astype({column: 'float32' for column in values})
+
+
+def get_years(
+        id_station: str,
+        years: list[int],
+        opening_date: datetime,
+        on_progress: Callable[[list[orders.OrderProgress]], None] | None = None,
+        cancel: threading.Event | None = None
+        ) -> pd.DataFrame:
+    """Get the daily climatological data of a station for several years.
+
+    Years found in the disk cache are not ordered again, the other ones are
+    ordered concurrently, only since their last stored date if they are in the
+    cache but stale.
+
+    Args:
+        id_station (str): station id number ;
+        years (list[int]): requested years ;
+        opening_date (datetime): opening date of the station ;
+        on_progress (Callable[[list[orders.OrderProgress]], None] | None,
+        optional): called regularly while waiting for the orders ;
+        cancel (threading.Event | None, optional): set to stop waiting for
+        the orders.
+
+    Returns:
+        pd.DataFrame: climatological data indexed by date, shared with the
+        other sessions so not to be modified.
+    """
+    frames = {}
+    # Year, period to order and stored data to complete of the missing years
+    missing = []
+    for year in years:
+        df = CACHE.get(id_station, year)
+        if df is not None:
+            frames[year] = df
+            continue
+
+        stored = CACHE.get(id_station, year, allow_stale=True)
+        if stored is not None and not stored.empty and 'DATE' in stored.columns:
+            period = incremental_period(
+                year, opening_date, stored['DATE'].max().to_pydatetime())
+            if period is None:
+                # Nothing new to order, the data are fresh again
+                frames[year] = CACHE.put(id_station, year, stored)
+                continue
+        else:
+            stored = None
+            period = year_period(year, opening_date)
+        missing.append((year, period, stored))
+
+    if missing:
+        client = Client()
+        retriever = orders.OrderRetriever(client, stream=True, cancel=cancel)
+        jobs = [
+            retriever.submit_order(
+                lambda period=period:
+                    client.order_daily_climatological_data(id_station, *period),
+                # Shared with the sessions ordering the same year
+                key=orders.order_key(constants.ORDER_DAILY_CLIMATOLOGICAL_URL,
+                                     id_station=id_station, start=period[0],
+                                     end=period[1])
+            )
+            for _, period, _ in missing
+        ]
+        responses = orders.wait_all(jobs, on_progress=on_progress)
+
+        for (year, period, stored), response in zip(missing, responses):
+            try:
+                # Parse the file while it is downloaded
+                with response:
+                    df = parsers.parse_daily(parsers.stream_text(response),
+                                             parsers.categorized_parameters())
+            except Exception as e:
+                raise Exception(
+                    f'Echec lors de la lecture de la réponse : {e}.')
+            if stored is not None:
+                df = merge_update(stored, df, datetime.strptime(
+                    period[0], '%Y-%m-%dT%H:%M:%SZ'))
+            frames[year] = CACHE.put(id_station, year, df)
+
+        # Add the complete years just retrieved to the normals of the station
+        normals.STORE.update(
+            id_station, {year: frames[year] for year, _, _ in missing})
+
+    if len(frames) == 1:
+        # The frame of the cache is shared, not copied
+        return frames[years[0]]
+
+    # Each year is indexed by date so the years follow each other
+    return compact(pd.concat([frames[year] for year in sorted(frames)]))
+
+
+def describe_climatological_data(data: pd.DataFrame) -> pd.DataFrame:
+    """Create descriptive statistics for climatological data.
+
+    Args:
+        data (pd.DataFrame): data to describe.
+
+    Returns:
+        pd.DataFrame: descriptive statistics.
+    """
+    df = data.iloc[:, 2:].describe().loc[['min', 'max', 'mean', '50%']]
+    df = df.rename(index={'min': 'Minimum','max': 'Maximum','mean': 'Moyenne',
+                          '50%': 'Médiane'})
+    return df
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+Persistent cache of the daily climatological data on disk.
+
+Data are stored in one Parquet file per station and year. Files written once
+their year is over never expire, while the file of the current year is
+considered stale after a while and can still be read to be completed. The
+total size of the cache is capped by removing the least recently used files
+first.
+
+The frames read or written are also kept in memory in a compact form, up to a
+memory budget shared by every session of the process. The same frame is
+returned to every session without being copied, so it must not be modified.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+import os
+import threading
+import time
+
+import pandas as pd
+
+import constants
+import files
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Store climatological data in their most compact dtypes, categorical
+    station id and float32 values, indexed by date.
+
+    Args:
+        df (pd.DataFrame): data with 'POSTE' and 'DATE' columns.
+
+    Returns:
+        pd.DataFrame: data, the same frame if already compact.
+    """
+    dtypes = {column: 'float32' for column in df.columns
+              if column not in ('POSTE', 'DATE') and df[column].dtype != 'float32'}
+    if 'POSTE' in df.columns and df['POSTE'].dtype != 'category':
+        dtypes['POSTE'] = 'category'
+    if dtypes:
+        df = df.astype(dtypes)
+    if 'DATE' in df.columns and not isinstance(df.index, pd.DatetimeIndex):
+        df = df.sort_values('DATE')
+        df.index = pd.DatetimeIndex(df['DATE']).rename(None)
+
+    return df
+
+
+class FrameCache(object):
+    """Frames kept in memory up to a size, the least recently used ones being
+    evicted first."""
+
+    def __init__(self, max_bytes: int = constants.CLIMATOLOGY_MEMORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key: tuple) -> pd.DataFrame | None:
+        """Get a frame, None if it is not in memory."""
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return None
+            self._frames.move_to_end(key)
+
+        return entry[0]
+
+
+    def put(self, key: tuple, df: pd.DataFrame) -> pd.DataFrame:
+        """Keep a frame in compact form and evict the least recently used ones
+        if the memory budget is exceeded.
+
+        Args:
+            key (tuple): key of the frame ;
+            df (pd.DataFrame): frame.
+
+        Returns:
+            pd.DataFrame: compact frame kept, to be used instead of the given
+            one.
+        """
+        df = compact(df)
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._discard(key)
+            if size <= self.max_bytes:
+                self._frames[key] = (df, size)
+                self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self._discard(next(iter(self._frames)))
+
+        return df
+
+
+    def _discard(self, key: tuple):
+        entry = self._frames.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+
+    def discard(self, key: tuple):
+        """Remove a frame from memory."""
+        with self._lock:
+            self._discard(key)
+
+
+    def clear(self):
+        """Remove every frame from memory."""
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+
+
+class ClimatologyCache(object):
+    """Parquet files cache of climatological data keyed by station and year,
+    with the recently used frames kept in memory."""
+
+    def __init__(
+            self,
+            folder: str | Path = constants.CLIMATOLOGY_CACHE_FOLDER,
+            max_bytes: int = constants.CLIMATOLOGY_CACHE_MAX_BYTES,
+            current_year_ttl: timedelta = constants.CLIMATOLOGY_CURRENT_YEAR_TTL,
+            memory: FrameCache | None = None):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.current_year_ttl = current_year_ttl
+        self.memory = memory or FrameCache()
+        self._lock = threading.Lock()
+
+
+    def _path(self, id_station: str, year: int) -> Path:
+        return self.folder / f'{id_station}-{year}.parquet'
+
+
+    def _is_stale(self, path: Path, year: int) -> bool:
+        """Only the data written before the end of their year can expire."""
+        mtime = path.stat().st_mtime
+        year_end = (datetime(year + 1, 1, 1)
+                    + constants.CLIMATOLOGY_AVAILABILITY_DELAY)
+        if datetime.fromtimestamp(mtime) >= year_end:
+            return False
+
+        return time.time() - mtime > self.current_year_ttl.total_seconds()
+
+
+    def get(self, id_station: str, year: int,
+            allow_stale: bool = False) -> pd.DataFrame | None:
+        """Read data from the cache.
+
+        Args:
+            id_station (str): station id number ;
+            year (int): year of the data ;
+            allow_stale (bool, optional): return stale data too, to complete
+            them.
+
+        Returns:
+            pd.DataFrame | None: cached data or None if missing or stale, not
+            to be modified.
+        """
+        path = self._path(id_station, year)
+        try:
+            if not allow_stale and self._is_stale(path, year):
+                return None
+            df = self.memory.get((id_station, year))
+            if df is None:
+                df = self.memory.put((id_station, year), pd.read_parquet(path))
+            # Record the access for the eviction order, keeping the mtime
+            # which dates the data
+            os.utime(path, (time.time(), path.stat().st_mtime))
+        except (OSError, ValueError):
+            self.memory.discard((id_station, year))
+            return None
+
+        return df
+
+
+    def put(self, id_station: str, year: int,
+            df: pd.DataFrame) -> pd.DataFrame:
+        """Write data to the cache and evict old files if the cache is full.
+
+        Args:
+            id_station (str): station id number ;
+            year (int): year of the data ;
+            df (pd.DataFrame): data to store.
+
+        Returns:
+            pd.DataFrame: compact data kept in memory, not to be modified.
+        """
+        df = self.memory.put((id_station, year), df)
+        path = self._path(id_station, year)
+        # Readers never see a partially written file
+        files.write_atomic(
+            path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        # Stamp with the same clock as the reads for the eviction order
+        now = time.time()
+        os.utime(path, (now, now))
+
+        self.evict()
+
+        return df
+
+
+    def evict(self):
+        """Remove the least recently used files until the cache size is below
+        its maximum."""
+        with self._lock:
+            files = []
+            for path in self.folder.glob('*.parquet'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_atime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                id_station, year = path.stem.rsplit('-', 1)
+                self.memory.discard((id_station, int(year)))
+                total -= size
+
+
+    def clear(self):
+        """Remove every file of the cache."""
+        with self._lock:
+            for path in self.folder.glob('*.parquet'):
+                path.unlink(missing_ok=True)
+        self.memory.clear()
+
+
+# Cache shared by every session of the application
+CACHE = ClimatologyCache()
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Search of French municipalities for the city selection of the application.
+
+Searches are answered from a local index of the municipalities when the
+communes csv file is available (see 'utils.download_communes_to_csv'), with an
+accent-insensitive autocomplete on the beginning of the names and a trigram
+matching for the rest. Otherwise the Adresse API is requested and its answers
+are cached in memory. Queries shorter than a minimum length are not searched.
+"""
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+import re
+import threading
+import unicodedata
+
+import pandas as pd
+
+import constants
+
+
+def fold(text: str) -> str:
+    """Normalize a text for matching : lowercase, without accents nor
+    punctuation.
+
+    Args:
+        text (str): text to normalize.
+
+    Returns:
+        str: normalized text.
+    """
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f' {text} '
+
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+
+class CommuneIndex(object):
+    """In-memory index of the municipalities ranked by population."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = (df.sort_values('population', ascending=False)
+                   .reset_index(drop=True))
+        folded = self.df['name'].map(fold).tolist()
+
+        # Sorted names for the prefix search
+        pairs = sorted((name, i) for i, name in enumerate(folded))
+        self._names = [name for name, _ in pairs]
+        self._positions = [i for _, i in pairs]
+
+        # Trigrams for the approximate search
+        self._trigrams = defaultdict(list)
+        for i, name in enumerate(folded):
+            for trigram in _trigrams(name):
+                self._trigrams[trigram].append(i)
+
+
+    def _prefix_positions(self, query: str) -> list[int]:
+        lo = bisect_left(self._names, query)
+        hi = bisect_left(self._names, query + '\uffff')
+
+        # Positions follow the population ranking
+        return sorted(self._positions[lo:hi])
+
+
+    def _trigram_positions(self, query: str) -> list[int]:
+        trigrams = _trigrams(query)
+        scores = Counter()
+        for trigram in trigrams:
+            scores.update(self._trigrams.get(trigram, ()))
+        threshold = max(1, len(trigrams) // 2)
+
+        return [i for i, _ in sorted(
+            ((i, score) for i, score in scores.items() if score >= threshold),
+            key=lambda x: (-x[1], x[0])
+        )]
+
+
+    def option(self, position: int) -> dict:
+        row = self.df.iloc[position]
+
+        return {
+            'label': row['name'],
+            'context': row['context'],
+            'coordinates': [float(row['latitude']), float(row['longitude'])]
+        }
+
+
+    def search(self, query: str, limit: int = constants.CITY_SEARCH_LIMIT) -> list[dict]:
+        """Search municipalities whose name starts with or looks like the
+        query.
+
+        Args:
+            query (str): searched city ;
+            limit (int, optional): maximum number of results.
+
+        Returns:
+            list[dict]: label, context and coordinates of the results.
+        """
+        query = fold(query)
+        positions = self._prefix_positions(query)[:limit]
+        if len(positions) < limit:
+            for i in self._trigram_positions(query):
+                if i not in positions:
+                    positions.append(i)
+                if len(positions) == limit:
+                    break
+
+        return [self.option(i) for i in positions]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> CommuneIndex | None:
+    """Get the process-wide municipalities index.
+
+    Returns:
+        CommuneIndex | None: index or None if the communes file is missing.
+    """
+    global _index
+
+    with _index_lock:
+        if _index is None and Path(constants.COMMUNES_PATH).exists():
+            _index = CommuneIndex(pd.read_csv(
+                constants.COMMUNES_PATH, sep=';',
+                dtype={'citycode': object, 'department': object}))
+
+        return _index
+
+
+@lru_cache(maxsize=constants.CITY_SEARCH_CACHE_SIZE)
+def _remote_search(query: str) -> tuple[dict]:
+    """Search municipalities with the Adresse API, caching the answers.
+
+    Args:
+        query (str): searched city.
+
+    Returns:
+        tuple[dict]: label, context and coordinates of the results.
+    """
+    # The api modules are only loaded without the local index
+    import requests
+    import utils
+
+    r = utils.search_city(query)
+
+    if r.status_code != requests.codes.ok:
+        # Errors are not cached
+        raise requests.HTTPError(r.status_code)
+
+    return tuple(
+        {
+            'label': _['properties']['label'],
+            'context': _['properties']['context'],
+            'coordinates': _['geometry']['coordinates'][::-1]
+        }
+        for _ in r.json().get('features')
+    )
+
+
+def search(query: str) -> list[dict]:
+    """Search municipalities locally if possible, otherwise remotely.
+
+    Args:
+        query (str): searched city.
+
+    Returns:
+        list[dict]: label, context and coordinates of the results, empty if
+        the query is too short or the search failed.
+    """
+    query = ' '.join(query.split())
+    if len(query) < constants.CITY_SEARCH_MIN_LENGTH:
+        return []
+
+    index = get_index()
+    if index is not None:
+        return index.search(query)
+
+    import requests
+
+    try:
+        return list(_remote_search(query.lower()))
+    except requests.RequestException:
+        return []
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,152 @@
 """Constants needed for the modules and the Streamlit application"""
 
+from datetime import timedelta
+import os
+
+# Base urls of the apis, which can be overridden with environment variables to
+# use a local server (see 'benchmarks/mock_server.py')
+METEO_FRANCE_PORTAL_URL = os.environ.get(
+    'METEOVIZ_PORTAL_URL', 'https://portail-api.meteofrance.fr')
+METEO_FRANCE_API_URL = os.environ.get(
+    'METEOVIZ_API_URL', 'https://public-api.meteofrance.fr')
+ADRESSE_API_URL = os.environ.get(
+    'METEOVIZ_ADRESSE_URL', 'https://api-adresse.data.gouv.fr')
+
 # Météo France apis
-TOKEN_URL = 'https://portail-api.meteofrance.fr/token'
-STATION_LIST_URL = 'https://public-api.meteofrance.fr/public/DPObs/v1/liste-stations'
-HOURLY_OBSERVATION_URL = 'https://public-api.meteofrance.fr/public/DPObs/v1/station/horaire'
-ORDER_HOURLY_CLIMATOLOGICAL_URL = 'https://public-api.meteofrance.fr/public/DPClim/v1/commande-station/horaire'
-ORDER_DAILY_CLIMATOLOGICAL_URL = 'https://public-api.meteofrance.fr/public/DPClim/v1/commande-station/quotidienne'
-ORDER_RECOVERY_URL = 'https://public-api.meteofrance.fr/public/DPClim/v1/commande/fichier'
+TOKEN_URL = f'{METEO_FRANCE_PORTAL_URL}/token'
+STATION_LIST_URL = f'{METEO_FRANCE_API_URL}/public/DPObs/v1/liste-stations'
+HOURLY_OBSERVATION_URL = f'{METEO_FRANCE_API_URL}/public/DPObs/v1/station/horaire'
+ORDER_HOURLY_CLIMATOLOGICAL_URL = f'{METEO_FRANCE_API_URL}/public/DPClim/v1/commande-station/horaire'
+ORDER_DAILY_CLIMATOLOGICAL_URL = f'{METEO_FRANCE_API_URL}/public/DPClim/v1/commande-station/quotidienne'
+ORDER_RECOVERY_URL = f'{METEO_FRANCE_API_URL}/public/DPClim/v1/commande/fichier'
+
+# Token management (in seconds)
+TOKEN_DEFAULT_LIFETIME = 3600
+TOKEN_REFRESH_MARGIN = 60
+
+# HTTP transport (pools per host, timeouts and backoff in seconds)
+HTTP_POOL_CONNECTIONS = 4
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_BACKOFF_MAX = 8
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_RETRY_AFTER_MAX = 10
+
+# HTTP metrics (latency buckets in seconds)
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seconds between two writes of the metrics file
+METRICS_FILE_INTERVAL = 15
+
+# DPClim orders polling (in seconds)
+ORDER_FIRST_DELAY = 1
+ORDER_BACKOFF_FACTOR = 1.5
+ORDER_MAX_DELAY = 10
+ORDER_DEADLINE = 90
+ORDER_PROGRESS_INTERVAL = 1
+ORDER_WORKERS = 8
+
+# Real-time observations of the nearest stations
+NEAREST_STATIONS_COUNT = 5
+OBSERVATION_WORKERS = 8
+OBSERVATION_PARAMETERS = ('t', 'u', 'ff', 'rr1', 'vv', 'sss', 'insolh', 'pres')
+
+# Observations at another date kept in memory for all the sessions
+OTHER_DATE_CACHE_SIZE = 32
+
+# Background retrievals on station selection : worker threads of the process
+# and retrievals in flight per session
+PREFETCH_WORKERS = 4
+PREFETCH_MAX_IN_FLIGHT = 2
+
+# Connections kept per host by the HTTP transport : one per worker thread of
+# the orders, observations and prefetch pools, plus the script threads of the
+# sessions requesting at the same time
+HTTP_POOL_SCRIPT_THREADS = 8
+HTTP_POOL_MAXSIZE = (ORDER_WORKERS + OBSERVATION_WORKERS + PREFETCH_WORKERS
+                     + HTTP_POOL_SCRIPT_THREADS)
+
+# Quotas of the Météo France apis : requests per minute of each api and of
+# some of their endpoints within it, maximum burst, tokens left to the
+# interactive requests by the background ones and maximum wait for a token
+# (in seconds). The orders placed leave part of the quota of DPClim to the
+# retrieval of their files.
+RATE_LIMITS = {
+    'DPClim': 50,
+    'DPClim/commande-station/quotidienne': 30,
+    'DPClim/commande-station/horaire': 30,
+    'DPObs': 50,
+}
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_RESERVE = 3
+RATE_LIMIT_MAX_WAIT = 30
 
 # Adresse apis
-ADRESS_SEARCH_URL = 'https://api-adresse.data.gouv.fr/search/'
-REVERSE_ADRESS_URL = 'https://api-adresse.data.gouv.fr/reverse/'
+ADRESS_SEARCH_URL = f'{ADRESSE_API_URL}/search/'
+REVERSE_ADRESS_URL = f'{ADRESSE_API_URL}/reverse/'
+
+# Découpage administratif api
+GEO_API_URL = 'https://geo.api.gouv.fr'
+COMMUNES_URL = f'{GEO_API_URL}/communes'
+DEPARTEMENTS_URL = f'{GEO_API_URL}/departements'
+REGIONS_URL = f'{GEO_API_URL}/regions'
+
+# City search
+CITY_SEARCH_MIN_LENGTH = 3
+CITY_SEARCH_LIMIT = 5
+CITY_SEARCH_CACHE_SIZE = 512
 
 # Files
 WEATHER_STATION_LIST_PATH = 'datasets/weather-stations-list.csv'
+DAILY_PARAMETERS_PATH = 'datasets/api-clim-table-parametres-quotidiens.csv'
+STATION_COMMUNES_PATH = 'datasets/weather-stations-communes.csv'
+COMMUNES_PATH = 'datasets/communes.csv'
+CLIMATOLOGY_CACHE_FOLDER = 'cache/climatology'
+HOURLY_CLIMATOLOGY_FOLDER = 'cache/hourly'
+NORMALS_FOLDER = 'cache/normals'
+WEATHER_STATION_SIDECAR_PATH = 'cache/weather-stations-list.parquet'
+
+# Climatology disk cache
+CLIMATOLOGY_CACHE_MAX_BYTES = 200 * 1024 * 1024
+CLIMATOLOGY_CURRENT_YEAR_TTL = timedelta(hours=6)
+# Memory used by the climatology frames shared by the sessions
+CLIMATOLOGY_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+# Delay before the daily data of a day are available and number of days
+# ordered again before the last stored one to get the late rows
+CLIMATOLOGY_AVAILABILITY_DELAY = timedelta(days=2)
+CLIMATOLOGY_RECONCILE_DAYS = 7
+
+# Hourly climatology bulk downloads : months per order (the api refuses long
+# periods at an hourly frequency), orders placed at the same time and deadline
+# of an order in seconds
+HOURLY_CHUNK_MONTHS = 3
+HOURLY_MAX_ORDERS = 4
+HOURLY_ORDER_DEADLINE = 300
+
+# Complete years needed to display the daily normals
+NORMALS_MIN_YEARS = 3
+# Stations whose normals are kept in memory
+NORMALS_MEMORY_STATIONS = 16
+
+# Width of the charts in pixels, to which the long series are downsampled
+CHART_WIDTH_PX = 700
+
+# Rows per chunk when parsing long csv files
+PARSE_CHUNK_ROWS = 50_000
+
+# Reverse geocoding : decimals of the latitude tried in turn and number of
+# coordinates kept in memory
+REVERSE_SEARCH_DECIMALS = (6, 3, 1)
+REVERSE_SEARCH_CACHE_SIZE = 1024
+# Stations reverse geocoded between two writes of the station to commune table
+STATION_COMMUNES_SAVE_EVERY = 100
+
+# Geodesy
+EARTH_RADIUS_KM = 6371.0088
+# Relative margin between great-circle and geodesic distances used to keep the
+# candidates for the nearest station
+GEODESIC_TOLERANCE = 0.02
 
 # Date and time format
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Downsampling of long time series before they are plotted.
+
+A chart can't display more points than its width in pixels, so the series are
+reduced to a few points per pixel before the figure is built, which keeps the
+figures light to send and fast to render in the browser :
+- 'minmax' keeps the minimum and the maximum of each bucket of consecutive
+points, so the peaks and the gaps (buckets without measure) are preserved ;
+- 'lttb' (Largest-Triangle-Three-Buckets) keeps in each bucket the point
+forming the largest triangle with its neighbours, which follows the visual
+shape of the line with a single point per bucket.
+"""
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('minmax', 'lttb')
+
+
+def _buckets(n: int, n_buckets: int) -> np.ndarray:
+    """Bucket of each of n consecutive points split in n_buckets of nearly
+    equal sizes."""
+    return np.arange(n) * n_buckets // n
+
+
+def minmax_indices(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Select the positions of the minimum and maximum of each bucket.
+
+    Args:
+        y (np.ndarray): values, NaN for missing measures ;
+        n_buckets (int): number of buckets.
+
+    Returns:
+        np.ndarray: sorted positions of the selected points, a bucket without
+        measure keeping one of its NaN to break the line.
+    """
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    bucket = _buckets(n, n_buckets)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    # NaN are sorted last so they are only selected from empty buckets
+    lowest = np.lexsort((y, bucket))[starts]
+    highest = np.lexsort((-y, bucket))[starts]
+
+    return np.union1d(lowest, highest)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Select points with the Largest-Triangle-Three-Buckets algorithm.
+
+    Args:
+        x (np.ndarray): abscissas in increasing order ;
+        y (np.ndarray): values, without NaN ;
+        n_out (int): number of points to keep, first and last included.
+
+    Returns:
+        np.ndarray: sorted positions of the selected points.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    # The first and last points are kept, the others are split in buckets
+    edges = 1 + np.arange(n_out - 1) * (n - 2) // (n_out - 2)
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype='int64')
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average point of the next bucket, or the last point
+        if i < n_out - 3:
+            nxt = slice(edges[i + 1], edges[i + 2])
+            cx, cy = x[nxt].mean(), y[nxt].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample(data: pd.DataFrame, n_buckets: int,
+               method: str = 'minmax') -> pd.DataFrame:
+    """Downsample each variable of climatological data separately.
+
+    Args:
+        data (pd.DataFrame): data with 'POSTE' and 'DATE' as first columns ;
+        n_buckets (int): number of buckets per variable, about the width of
+        the chart in pixels ;
+        method (str, optional): 'minmax' or 'lttb'.
+
+    Returns:
+        pd.DataFrame: 'DATE', 'variable' and 'value' columns in long format,
+        each variable with its own selected dates.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown downsampling method : {method}')
+
+    dates = data['DATE'].to_numpy()
+    frames = []
+    for column in data.columns[2:]:
+        y = data[column].to_numpy(dtype='float64')
+        if method == 'minmax':
+            positions = minmax_indices(y, n_buckets)
+        else:
+            measured = np.flatnonzero(~np.isnan(y))
+            x = dates[measured].astype('datetime64[ns]').astype('float64')
+            positions = measured[lttb_indices(x, y[measured], n_buckets)]
+        frames.append(pd.DataFrame({
+            'DATE': dates[positions],
+            'variable': column,
+            'value': y[positions]
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
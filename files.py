@@ -0,0 +1,41 @@
+"""
+Files shared by the threads and processes of the application.
+
+The datasets and caches are read by the running applications while a session,
+a background retrieval or a maintenance command writes them. They are written
+through a temporary file named after the process and the thread, then renamed
+over the previous one, so that readers see either the previous file or the
+new one and two writers never share a temporary file.
+"""
+
+from pathlib import Path
+from typing import Callable
+import os
+import threading
+
+
+def write_atomic(path: str | Path, write: Callable[[Path], None]):
+    """Write a file through a temporary file renamed over it, removing the
+    temporary file if the write fails.
+
+    Args:
+        path (str | Path): file to write ;
+        write (Callable[[Path], None]): writes the content to the temporary
+        file given.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
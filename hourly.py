@@ -0,0 +1,318 @@
+"""
+Bulk download of the hourly climatological data of a station over long
+periods.
+
+The period is split in chunks of a few calendar months, aligned on the year,
+which are ordered and polled concurrently with a bounded number of orders in
+flight. Each chunk is parsed by parts from the response stream and written
+to its own Parquet file, so that the memory used doesn't depend on the length
+of the chunks, and an interrupted download resumes with the missing chunks
+only. The files of a station form a dataset read back as a single frame.
+
+Run from the repository root :
+python hourly.py 07149001 2020-01-01 2023-12-31
+"""
+
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterable
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import constants
+import files
+import orders
+import parsers
+import ratelimit
+from meteo_france import Client
+
+CHUNK_FILE_FORMAT = '%Y%m%d%H'
+
+
+def chunk_periods(start: datetime, end: datetime,
+                  months: int = constants.HOURLY_CHUNK_MONTHS
+                  ) -> list[tuple[datetime, datetime]]:
+    """Split a period in chunks aligned on calendar months, the first and last
+    ones being clipped to the period.
+
+    Args:
+        start (datetime): first hour of the period (UTC) ;
+        end (datetime): last hour of the period (UTC, included) ;
+        months (int, optional): months per chunk, a divisor of 12.
+
+    Returns:
+        list[tuple[datetime, datetime]]: first and last hours of the chunks.
+    """
+    chunks = []
+    # Boundaries are on the same grid whatever the period
+    month = (start.month - 1) // months * months + 1
+    boundary = datetime(start.year, month, 1)
+    while boundary <= end:
+        month = boundary.month - 1 + months
+        following = datetime(boundary.year + month // 12, month % 12 + 1, 1)
+        chunks.append((max(boundary, start),
+                       min(following - timedelta(hours=1), end)))
+        boundary = following
+
+    return chunks
+
+
+class HourlyDataset(object):
+    """Parquet files of the hourly data of a station, one per chunk named after
+    its first and last hours."""
+
+    def __init__(self, id_station: str,
+                 folder: str | Path = constants.HOURLY_CLIMATOLOGY_FOLDER):
+        self.id_station = id_station
+        self.folder = Path(folder) / id_station
+
+
+    def _path(self, start: datetime, end: datetime) -> Path:
+        return self.folder / (f'{start:{CHUNK_FILE_FORMAT}}-'
+                              f'{end:{CHUNK_FILE_FORMAT}}.parquet')
+
+
+    def files(self) -> list[tuple[datetime, datetime, Path]]:
+        """List the stored chunks.
+
+        Returns:
+            list[tuple[datetime, datetime, Path]]: first and last hours and
+            file of each chunk, in chronological order.
+        """
+        files = []
+        for path in self.folder.glob('*.parquet'):
+            try:
+                start, end = (datetime.strptime(_, CHUNK_FILE_FORMAT)
+                              for _ in path.stem.split('-'))
+            except ValueError:
+                continue
+            files.append((start, end, path))
+
+        return sorted(files)
+
+
+    def has(self, start: datetime, end: datetime) -> bool:
+        """Check that a chunk is stored, possibly by a longer one."""
+        return any(stored_start <= start and end <= stored_end
+                   for stored_start, stored_end, _ in self.files())
+
+
+    def write(self, start: datetime, end: datetime,
+              chunks: Iterable[pd.DataFrame]):
+        """Store a chunk from its data read by parts, replacing the shorter
+        ones it covers.
+
+        Args:
+            start (datetime): first hour of the chunk ;
+            end (datetime): last hour of the chunk ;
+            chunks (Iterable[pd.DataFrame]): data of the chunk, each part
+            being written before the next one is read.
+        """
+        path = self._path(start, end)
+
+        def write_parts(tmp_path: Path):
+            writer = None
+            try:
+                for df in chunks:
+                    if writer is None:
+                        table = pa.Table.from_pandas(df, preserve_index=False)
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    else:
+                        table = pa.Table.from_pandas(
+                            df, schema=writer.schema, preserve_index=False)
+                    writer.write_table(table)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if writer is None:
+                # Empty file, nothing measured over the chunk
+                pd.DataFrame(columns=['POSTE', 'DATE']).to_parquet(tmp_path)
+
+        # An interrupted download never leaves a partial chunk
+        files.write_atomic(path, write_parts)
+
+        for stored_start, stored_end, stored_path in self.files():
+            if (stored_path != path
+                    and start <= stored_start and stored_end <= end):
+                stored_path.unlink(missing_ok=True)
+
+
+    def put(self, start: datetime, end: datetime, df: pd.DataFrame):
+        """Store a chunk, replacing the shorter ones it covers.
+
+        Args:
+            start (datetime): first hour of the chunk ;
+            end (datetime): last hour of the chunk ;
+            df (pd.DataFrame): data of the chunk.
+        """
+        self.write(start, end, [df])
+
+
+    def load(self, start: datetime | None = None, end: datetime | None = None,
+             columns: list[str] | None = None) -> pd.DataFrame:
+        """Read the stored data of a period as a single frame.
+
+        Args:
+            start (datetime | None, optional): first hour, from the beginning
+            of the data if None ;
+            end (datetime | None, optional): last hour (included), up to the
+            end of the data if None ;
+            columns (list[str] | None, optional): parameters to read, all of
+            them if None.
+
+        Returns:
+            pd.DataFrame: hourly data indexed by date.
+        """
+        filters = []
+        if start is not None:
+            filters.append(('DATE', '>=', start))
+        if end is not None:
+            filters.append(('DATE', '<=', end))
+        if columns is not None:
+            columns = ['POSTE', 'DATE'] + [c for c in columns
+                                           if c not in ('POSTE', 'DATE')]
+
+        frames = []
+        for chunk_start, chunk_end, path in self.files():
+            if ((start is not None and chunk_end < start)
+                    or (end is not None and chunk_start > end)):
+                continue
+            metadata = pq.read_metadata(path)
+            if metadata.num_rows == 0:
+                # Nothing measured over the chunk, its file has no parameter
+                continue
+            stored = metadata.schema.to_arrow_schema().names
+            df = pd.read_parquet(
+                path, filters=filters or None,
+                columns=None if columns is None else [
+                    c for c in columns if c in stored])
+            if columns is not None:
+                # Parameters not measured over the chunk, typed like the
+                # measured ones
+                df = df.reindex(columns=columns).astype(
+                    {c: 'float32' for c in columns if c not in stored})
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=columns or ['POSTE', 'DATE'])
+
+        df = pd.concat(frames, ignore_index=True).sort_values('DATE')
+        df.index = pd.DatetimeIndex(df['DATE']).rename(None)
+
+        return df
+
+
+class HourlyDownloader(object):
+    """Download the hourly data of a station over a period into its
+    dataset."""
+
+    def __init__(self, id_station: str,
+                 dataset: HourlyDataset | None = None,
+                 months: int = constants.HOURLY_CHUNK_MONTHS,
+                 max_orders: int = constants.HOURLY_MAX_ORDERS,
+                 retriever: orders.OrderRetriever | None = None):
+        self.id_station = id_station
+        self.dataset = dataset or HourlyDataset(id_station)
+        self.months = months
+        self.max_orders = max_orders
+        self.client = Client(priority=ratelimit.BACKGROUND)
+        self.retriever = retriever or orders.OrderRetriever(
+            self.client, deadline=constants.HOURLY_ORDER_DEADLINE, stream=True)
+
+
+    def missing_chunks(self, start: datetime,
+                       end: datetime) -> list[tuple[datetime, datetime]]:
+        """List the chunks of a period not stored yet."""
+        return [chunk for chunk in chunk_periods(start, end, self.months)
+                if not self.dataset.has(*chunk)]
+
+
+    def _submit(self, chunk: tuple[datetime, datetime]) -> tuple:
+        period = [f'{_:%Y-%m-%dT%H:00:00Z}' for _ in chunk]
+
+        return self.retriever.submit_order(
+            lambda: self.client.order_hourly_climatological_data(
+                self.id_station, *period))
+
+
+    def download(self, start: datetime, end: datetime,
+                 on_progress: Callable[[int, int], None] | None = None
+                 ) -> HourlyDataset:
+        """Download the chunks of a period which are not stored yet, with a
+        bounded number of orders at the same time.
+
+        Args:
+            start (datetime): first hour of the period (UTC) ;
+            end (datetime): last hour of the period (UTC, included) ;
+            on_progress (Callable[[int, int], None] | None, optional): called
+            with the numbers of chunks stored and to store after each chunk.
+
+        Raises:
+            orders.OrderError: if some chunks failed, once the other ones are
+            stored. Downloading again retries the failed chunks only.
+
+        Returns:
+            HourlyDataset: dataset of the station.
+        """
+        queue = self.missing_chunks(start, end)
+        total = len(queue)
+        queue.reverse()
+        running = {}
+        stored = 0
+        errors = []
+
+        while queue or running:
+            while queue and len(running) < self.max_orders:
+                chunk = queue.pop()
+                future, _ = self._submit(chunk)
+                running[future] = chunk
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk = running.pop(future)
+                try:
+                    response = future.result()
+                    # Parse the file while it is downloaded
+                    with response:
+                        self.dataset.write(*chunk, parsers.iter_hourly(
+                            parsers.stream_text(response)
+                            if self.retriever.stream else response.text))
+                except Exception as e:
+                    errors.append((chunk, e))
+                    continue
+                stored += 1
+                if on_progress is not None:
+                    on_progress(stored, total)
+
+        if errors:
+            (first_start, first_end), error = errors[0]
+            raise orders.OrderError(
+                f'{len(errors)} période(s) sur {total} non téléchargée(s), '
+                f'dont {first_start:%d/%m/%Y} - {first_end:%d/%m/%Y} : {error}')
+
+        return self.dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('id_station', help='id de la station')
+    parser.add_argument('start', type=datetime.fromisoformat,
+                        help='début de la période (AAAA-MM-JJ)')
+    parser.add_argument('end', type=datetime.fromisoformat,
+                        help='fin de la période (AAAA-MM-JJ)')
+    args = parser.parse_args()
+
+    end = args.end.replace(hour=23)
+    downloader = HourlyDownloader(args.id_station)
+    dataset = downloader.download(
+        args.start, end,
+        on_progress=lambda stored, total: print(f'{stored}/{total} période(s)'))
+    df = dataset.load(args.start, end)
+    print(f'{len(df.index)} relevés horaires dans {dataset.folder}')
+
+
+if __name__ == '__main__':
+    main()
@@ -11,43 +11,148 @@ An APPLICATION_ID is needed, to get it :
 2. The APPLICATION_ID can be found in the cURL command at the bottom of the page.
 """
 
+import threading
+import time
+
 import requests
 from streamlit import secrets
 
 import constants
+import ratelimit
+from metrics import METRICS, endpoint_name
+from ratelimit import RATE_LIMITER
+from transport import SESSION
+
+
+def application_id() -> str:
+    """Read the APPLICATION_ID from the Streamlit secrets, only when a token
+    is requested so that importing the module doesn't need them."""
+    return secrets.APPLICATION_ID
+
+
+class TokenManager(object):
+    """Thread-safe holder of the API access token.
+
+    The token is refreshed a little before its expiry and only one refresh is
+    dispatched at a time, the other threads waiting for its result.
+    """
+
+    def __init__(self, session: requests.Session,
+                 refresh_margin: float = constants.TOKEN_REFRESH_MARGIN):
+        self.session = session
+        self.refresh_margin = refresh_margin
+        self.refresh_count = 0
+        self._token = None
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+
+
+    def _is_valid(self) -> bool:
+        return (self._token is not None
+                and time.monotonic() < self._refresh_at)
+
+
+    def get_token(self) -> str:
+        """Get a valid token, refreshing it if needed.
+
+        Returns:
+            str: access token.
+        """
+        if self._is_valid():
+            return self._token
+
+        with self._lock:
+            # The token may have been refreshed while we were waiting
+            if not self._is_valid():
+                self._refresh()
+
+            return self._token
+
+
+    def invalidate(self, token: str):
+        """Mark a token rejected by the API as expired.
+
+        Args:
+            token (str): rejected token, ignored if it has already been
+            replaced by a fresh one.
+        """
+        with self._lock:
+            if token == self._token:
+                self._refresh_at = 0.0
+
+
+    def _refresh(self):
+        # Obtain new token
+        data = {'grant_type': 'client_credentials'}
+        headers = {'Authorization': 'Basic ' + application_id()}
+        access_token_response = self.session.post(
+            constants.TOKEN_URL,
+            data=data,
+            verify=True,
+            allow_redirects=False,
+            headers=headers
+        )
+        access_token_response.raise_for_status()
+        content = access_token_response.json()
+
+        lifetime = float(
+            content.get('expires_in', constants.TOKEN_DEFAULT_LIFETIME))
+
+        self._token = content['access_token']
+        # Refresh ahead of expiry, even for tokens shorter lived than the margin
+        self._refresh_at = (time.monotonic() + lifetime
+                            - min(self.refresh_margin, lifetime / 2))
+        self.refresh_count += 1
+        METRICS.token_refresh()
+
+
+# Token shared by every client of the process
+TOKEN_MANAGER = TokenManager(SESSION)
 
-# Import ID from Streamlit secrets
-APPLICATION_ID = secrets.APPLICATION_ID
 
 class Client(object):
+    """Client of the Météo France apis.
+
+    Args:
+        priority (str | None, optional): priority of the requests for the rate
+        limiter, the one of the context the client is created in if None.
+    """
 
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, priority: str | None = None):
+        self.session = SESSION
+        self.token_manager = TOKEN_MANAGER
+        self.priority = priority or ratelimit.current_priority()
 
 
     def request(self, method, url, **kwargs):
-        # First request will always need to obtain a token first
-        if 'Authorization' not in self.session.headers:
-            self.obtain_token()
+        headers = dict(kwargs.pop('headers', None) or {})
 
+        token = self.token_manager.get_token()
+        headers['Authorization'] = 'Bearer %s' % token
         # Optimistically attempt to dispatch request
-        response = self.session.request(method, url, **kwargs)
+        RATE_LIMITER.acquire(url, self.priority)
+        response = self.session.request(method, url, headers=headers, **kwargs)
         if self.token_has_expired(response):
             # We got an 'Access token expired' response => refresh token
-            self.obtain_token()
+            self.token_manager.invalidate(token)
+            headers['Authorization'] = 'Bearer %s' % self.token_manager.get_token()
             # Re-dispatch the request that previously failed
-            response = self.session.request(method, url, **kwargs)
+            METRICS.retry(endpoint_name(url))
+            RATE_LIMITER.acquire(url, self.priority)
+            response = self.session.request(method, url, headers=headers, **kwargs)
 
         return response
 
 
     def token_has_expired(self, response):
         status = response.status_code
-        content_type = response.headers['Content-Type']
-        repJson = response.text
+        content_type = response.headers.get('Content-Type', '')
         if status == 401 and 'application/json' in content_type:
-            repJson = response.text
-            if 'Invalid JWT token' in repJson['description']:
+            try:
+                repJson = response.json()
+            except ValueError:
+                return False
+            if 'Invalid JWT token' in repJson.get('description', ''):
 
                 return True
             
@@ -55,31 +160,28 @@ class Client(object):
 
 
     def obtain_token(self):
-        # Obtain new token
-        data = {'grant_type': 'client_credentials'}
-        headers = {'Authorization': 'Basic ' + APPLICATION_ID}
-        access_token_response = requests.post(
-            constants.TOKEN_URL,
-            data=data,
-            verify=True,
-            allow_redirects=False,
-            headers=headers
-        )
-        token = access_token_response.json()['access_token']
-        # Update session with fresh token
-        self.session.headers.update({'Authorization': 'Bearer %s' % token})
+        # Force the shared token to be renewed
+        self.token_manager.invalidate(self.token_manager.get_token())
+        self.token_manager.get_token()
 
 
-    def get_stations_list(self) -> requests.Response:
+    def get_stations_list(self, etag: str | None = None) -> requests.Response:
         """Get the list of observation stations from the API.
 
+        Args:
+            etag (str | None, optional): ETag of the list already downloaded,
+            to get a 304 response without the data if it hasn't changed.
+
         Returns:
             requests.Response: Response from the API with the data in csv.
         """
-        self.session.headers.update({'Accept': 'application/json'})
+        headers = {'Accept': 'application/json'}
+        if etag:
+            headers['If-None-Match'] = etag
         r = self.request(
             method='GET',
-            url=constants.STATION_LIST_URL
+            url=constants.STATION_LIST_URL,
+            headers=headers
         )
 
         return r
@@ -97,7 +199,6 @@ class Client(object):
         Returns:
             requests.Response: Response from the API with the data in json.
         """
-        self.session.headers.update({'Accept': 'application/json'})
         payload={
             'id_station': id_station,
             'date': date,
@@ -106,7 +207,8 @@ class Client(object):
         r = self.request(
             method='GET',
             url=constants.HOURLY_OBSERVATION_URL,
-            params=payload
+            params=payload,
+            headers={'Accept': 'application/json'}
         )
 
         return r
@@ -127,7 +229,6 @@ class Client(object):
         Returns:
             requests.Response: Response from the API with order id in a json.
         """
-        self.session.headers.update({'Accept': 'application/json'})
         payload={
             'id-station': id_station,
             'date-deb-periode': start_date,
@@ -136,7 +237,8 @@ class Client(object):
         r = self.request(
             method='GET',
             url=constants.ORDER_HOURLY_CLIMATOLOGICAL_URL,
-            params=payload
+            params=payload,
+            headers={'Accept': 'application/json'}
         )
 
         return r
@@ -167,7 +269,6 @@ class Client(object):
         - end_date : end of period for the order (string) in ISO 8601 format
         with TZ UTC AAAA-MM-JJThh:00:00Z.
         '''
-        self.session.headers.update({'Accept': 'application/json'})
         payload={
             'id-station': id_station,
             'date-deb-periode': start_date,
@@ -176,27 +277,32 @@ class Client(object):
         r = self.request(
             method='GET',
             url=constants.ORDER_DAILY_CLIMATOLOGICAL_URL,
-            params=payload
+            params=payload,
+            headers={'Accept': 'application/json'}
         )
 
         return r
     
 
-    def order_recovery(self, order_id: str) -> requests.Response:
+    def order_recovery(self, order_id: str,
+                       stream: bool = False) -> requests.Response:
         """Retrieve data from an order.
 
         Args:
-            order_id (str): id of the order.
+            order_id (str): id of the order ;
+            stream (bool, optional): don't read the body of the response, to
+            parse it while it is downloaded.
 
         Returns:
             requests.Response: Response from the API with the data in csv.
         """
-        self.session.headers.update({'Accept': 'application/json'})
         payload={'id-cmde': order_id}
         r = self.request(
             method='GET',
             url=constants.ORDER_RECOVERY_URL,
-            params=payload
+            params=payload,
+            headers={'Accept': 'application/json'},
+            stream=stream
         )
 
         return r
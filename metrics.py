@@ -0,0 +1,353 @@
+"""
+Instrumentation of the outbound HTTP requests of the application.
+
+Each request sent through an 'InstrumentedSession' is recorded per endpoint :
+number of calls per status code, latency histogram, bytes transferred and
+connection errors. Retries and token refreshes are counted by the clients.
+
+Metrics are exported in the Prometheus text format, through a local HTTP
+endpoint started when the METEOVIZ_METRICS_PORT environment variable is set, or
+to the file given by the METEOVIZ_METRICS_FILE environment variable, written
+regularly and at exit. They are also summarized for the debug panel of the
+application.
+"""
+
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+import atexit
+import bisect
+import os
+import re
+import threading
+import time
+
+import requests
+
+import constants
+import files
+
+
+def endpoint_name(url: str) -> str:
+    """Name an endpoint after the path of its url, without the api prefix.
+
+    Args:
+        url (str): requested url.
+
+    Returns:
+        str: endpoint name, e.g. 'commande-station/quotidienne'.
+    """
+    path = urlparse(url).path.strip('/')
+
+    return re.sub(r'^public/[^/]+/v\d+/', '', path) or '/'
+
+
+class EndpointStats(object):
+    """Metrics of one endpoint."""
+
+    def __init__(self, buckets: tuple[float]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.statuses = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.count = 0
+        self.duration_sum = 0.0
+        self.duration_max = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+
+    def observe(self, duration: float, status: int, sent: int, received: int):
+        self.count += 1
+        self.duration_sum += duration
+        self.duration_max = max(self.duration_max, duration)
+        self.bucket_counts[bisect.bisect_left(self.buckets, duration)] += 1
+        self.statuses[status] += 1
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+
+    def quantile(self, q: float) -> float:
+        """Estimate a latency quantile as the upper bound of its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulated = 0
+        for bound, n in zip(self.buckets, self.bucket_counts):
+            cumulated += n
+            if cumulated >= rank:
+                return bound
+
+        return self.duration_max
+
+
+class Metrics(object):
+    """Thread-safe registry of the HTTP metrics of the process."""
+
+    def __init__(self, buckets: tuple[float] = constants.METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.token_refreshes = 0
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        if endpoint not in self._endpoints:
+            self._endpoints[endpoint] = EndpointStats(self.buckets)
+
+        return self._endpoints[endpoint]
+
+
+    def observe(self, endpoint: str, duration: float, status: int,
+                sent: int = 0, received: int = 0):
+        """Record a response."""
+        with self._lock:
+            self._stats(endpoint).observe(duration, status, sent, received)
+
+
+    def error(self, endpoint: str, error: Exception):
+        """Record a request which failed without response."""
+        with self._lock:
+            self._stats(endpoint).errors[type(error).__name__] += 1
+
+
+    def retry(self, endpoint: str):
+        """Record a request dispatched again."""
+        with self._lock:
+            self._stats(endpoint).retries += 1
+
+
+    def token_refresh(self):
+        """Record a token refresh."""
+        with self._lock:
+            self.token_refreshes += 1
+
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.token_refreshes = 0
+
+
+    def summary(self) -> list[dict]:
+        """Summarize the metrics of each endpoint.
+
+        Returns:
+            list[dict]: one row per endpoint, durations in ms.
+        """
+        with self._lock:
+            return [
+                {
+                    'endpoint': endpoint,
+                    'calls': stats.count,
+                    'errors': (sum(n for status, n in stats.statuses.items()
+                                   if status >= 400)
+                               + sum(stats.errors.values())),
+                    'retries': stats.retries,
+                    'mean_ms': (stats.duration_sum / stats.count * 1000
+                                if stats.count else 0.0),
+                    'p95_ms': stats.quantile(0.95) * 1000,
+                    'max_ms': stats.duration_max * 1000,
+                    'kb_received': stats.bytes_received / 1024,
+                }
+                for endpoint, stats in sorted(self._endpoints.items())
+            ]
+
+
+    def render_prometheus(self) -> str:
+        """Export the metrics in the Prometheus text format.
+
+        Returns:
+            str: metrics.
+        """
+        lines = []
+
+        def header(name: str, kind: str, text: str):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+            header('meteoviz_http_requests_total', 'counter',
+                   'Responses received per endpoint and status code.')
+            for endpoint, stats in endpoints:
+                for status, n in sorted(stats.statuses.items()):
+                    lines.append(f'meteoviz_http_requests_total{{endpoint="{endpoint}",'
+                                 f'status="{status}"}} {n}')
+
+            header('meteoviz_http_errors_total', 'counter',
+                   'Requests failed without response per endpoint.')
+            for endpoint, stats in endpoints:
+                for error, n in sorted(stats.errors.items()):
+                    lines.append(f'meteoviz_http_errors_total{{endpoint="{endpoint}",'
+                                 f'error="{error}"}} {n}')
+
+            header('meteoviz_http_request_duration_seconds', 'histogram',
+                   'Duration of the requests per endpoint.')
+            for endpoint, stats in endpoints:
+                cumulated = 0
+                for bound, n in zip(stats.buckets + (float('inf'),),
+                                    stats.bucket_counts):
+                    cumulated += n
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'meteoviz_http_request_duration_seconds_bucket'
+                                 f'{{endpoint="{endpoint}",le="{le}"}} {cumulated}')
+                lines.append(f'meteoviz_http_request_duration_seconds_sum'
+                             f'{{endpoint="{endpoint}"}} {stats.duration_sum:.6f}')
+                lines.append(f'meteoviz_http_request_duration_seconds_count'
+                             f'{{endpoint="{endpoint}"}} {stats.count}')
+
+            for name, attribute, text in (
+                    ('meteoviz_http_sent_bytes_total', 'bytes_sent',
+                     'Bytes of the request bodies per endpoint.'),
+                    ('meteoviz_http_received_bytes_total', 'bytes_received',
+                     'Bytes of the response bodies per endpoint.'),
+                    ('meteoviz_http_retries_total', 'retries',
+                     'Requests dispatched again per endpoint.')):
+                header(name, 'counter', text)
+                for endpoint, stats in endpoints:
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} '
+                                 f'{getattr(stats, attribute)}')
+
+            header('meteoviz_token_refreshes_total', 'counter',
+                   'Access tokens obtained from the Météo France portal.')
+            lines.append(f'meteoviz_token_refreshes_total {self.token_refreshes}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def write_prometheus(self, path: str | Path):
+        """Write the metrics in the Prometheus text format to a file, read by
+        the textfile collector of a Prometheus node exporter for instance."""
+        content = self.render_prometheus()
+        files.write_atomic(
+            path, lambda tmp_path: tmp_path.write_text(content, encoding='utf-8'))
+
+
+# Metrics of the process
+METRICS = Metrics()
+
+
+class InstrumentedSession(requests.Session):
+    """Session recording the metrics of every request it sends."""
+
+    def __init__(self, metrics: Metrics = METRICS):
+        super().__init__()
+        self.metrics = metrics
+
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        endpoint = endpoint_name(request.url)
+        sent = len(request.body or b'')
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.RequestException as e:
+            self.metrics.error(endpoint, e)
+            raise
+
+        # The body of streamed responses is not read here
+        if kwargs.get('stream'):
+            received = int(response.headers.get('Content-Length', 0))
+        else:
+            received = len(response.content or b'')
+        self.metrics.observe(endpoint, time.perf_counter() - start,
+                             response.status_code, sent, received)
+
+        return response
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = METRICS.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve the metrics in the Prometheus text format on a local port, once
+    per process.
+
+    Args:
+        port (int): port of the endpoint ;
+        host (str, optional): interface of the endpoint.
+
+    Returns:
+        ThreadingHTTPServer: metrics server.
+    """
+    global _server
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever,
+                             name='metrics-server', daemon=True).start()
+
+        return _server
+
+
+_writer = None
+
+
+def start_metrics_file(path: str | Path,
+                       interval: float = constants.METRICS_FILE_INTERVAL
+                       ) -> threading.Thread:
+    """Write the metrics in the Prometheus text format to a file regularly and
+    at exit, once per process.
+
+    Args:
+        path (str | Path): metrics file ;
+        interval (float, optional): seconds between two writes.
+
+    Returns:
+        threading.Thread: thread writing the file.
+    """
+    global _writer
+
+    def write_regularly():
+        while True:
+            time.sleep(interval)
+            try:
+                METRICS.write_prometheus(path)
+            except OSError:
+                # Written again at the next interval
+                pass
+
+    with _server_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=write_regularly,
+                                       name='metrics-file', daemon=True)
+            _writer.start()
+            atexit.register(METRICS.write_prometheus, path)
+
+        return _writer
+
+
+if os.environ.get('METEOVIZ_METRICS_PORT'):
+    start_metrics_server(int(os.environ['METEOVIZ_METRICS_PORT']))
+if os.environ.get('METEOVIZ_METRICS_FILE'):
+    start_metrics_file(os.environ['METEOVIZ_METRICS_FILE'])
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
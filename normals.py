@@ -0,0 +1,274 @@
+"""
+Daily climate normals of the stations.
+
+The daily values of the complete years retrieved for a station are kept on
+disk in a (year, day of year) table, and the normals of each day of the year
+are computed from it across all the years at once : mean, percentiles and
+records with their year. The table grows with each new year retrieved and the
+normals, stored next to it, are only computed again when it changes, so the
+application reads them without processing every year on each render.
+
+Days are numbered on a leap year calendar so that a date has the same number
+every year, the 29th of February being 60.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import constants
+import files
+
+DAYS = 366
+PERCENTILES = (10, 50, 90)
+
+
+def day_of_year(dates: pd.Series | pd.DatetimeIndex) -> np.ndarray:
+    """Number the days on a leap year calendar, from 1 to 366.
+
+    Args:
+        dates (pd.Series | pd.DatetimeIndex): dates.
+
+    Returns:
+        np.ndarray: day of the year of each date.
+    """
+    dates = pd.DatetimeIndex(dates)
+    shift = (~dates.is_leap_year) & (dates.month > 2)
+
+    return dates.dayofyear.to_numpy() + shift.astype('int64')
+
+
+def compute_normals(values: pd.DataFrame) -> pd.DataFrame:
+    """Compute the normals of each day of the year and parameter.
+
+    Args:
+        values (pd.DataFrame): daily values with 'YEAR' and 'DAY' columns.
+
+    Returns:
+        pd.DataFrame: one row per day and parameter with the number of years,
+        mean, percentiles, records and years of the records.
+    """
+    parameters = values.columns.difference(['YEAR', 'DAY'], sort=False)
+    years = np.sort(values['YEAR'].unique())
+
+    # Values in a (year, day, parameter) array
+    cube = np.full((len(years), DAYS, len(parameters)), np.nan, dtype='float32')
+    cube[np.searchsorted(years, values['YEAR']), values['DAY'] - 1] = (
+        values[parameters].to_numpy(dtype='float32'))
+
+    measured = ~np.isnan(cube)
+    count = measured.sum(axis=0)
+    with warnings.catch_warnings():
+        # Days never measured give NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        stats = {
+            'mean': np.nanmean(cube, axis=0),
+            **{f'p{q}': p for q, p in zip(
+                PERCENTILES, np.nanpercentile(cube, PERCENTILES, axis=0))},
+            'min': np.nanmin(cube, axis=0),
+            'max': np.nanmax(cube, axis=0),
+        }
+    stats['min_year'] = years[np.where(measured, cube, np.inf).argmin(axis=0)]
+    stats['max_year'] = years[np.where(measured, cube, -np.inf).argmax(axis=0)]
+
+    df = pd.DataFrame({
+        'DAY': np.repeat(np.arange(1, DAYS + 1), len(parameters)),
+        'parameter': np.tile(parameters, DAYS),
+        'years': count.ravel(),
+    })
+    for name, stat in stats.items():
+        df[name] = stat.ravel()
+    df[['min_year', 'max_year']] = df[['min_year', 'max_year']].where(
+        df['years'] > 0)
+
+    return df.astype({name: 'float32' for name in ('mean', 'min', 'max')}
+                     | {f'p{q}': 'float32' for q in PERCENTILES}
+                     | {'min_year': 'Int16', 'max_year': 'Int16'})
+
+
+class NormalsStore(object):
+    """Daily values of the complete years and normals of each station, in two
+    Parquet files per station.
+
+    The years of each station and the normals of the last stations read are
+    kept in memory with the modification time of their file, so that they are
+    only read again once another process has changed them.
+    """
+
+    def __init__(self, folder: str | Path = constants.NORMALS_FOLDER,
+                 max_stations: int = constants.NORMALS_MEMORY_STATIONS):
+        self.folder = Path(folder)
+        self.max_stations = max_stations
+        self._years = {}
+        self._normals = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def _path(self, id_station: str, kind: str) -> Path:
+        return self.folder / f'{id_station}-{kind}.parquet'
+
+
+    def _read(self, id_station: str, kind: str) -> pd.DataFrame | None:
+        try:
+            return pd.read_parquet(self._path(id_station, kind))
+        except (OSError, ValueError):
+            return None
+
+
+    def _mtime(self, id_station: str, kind: str) -> int | None:
+        try:
+            return self._path(id_station, kind).stat().st_mtime_ns
+        except OSError:
+            return None
+
+
+    def _write(self, id_station: str, kind: str, df: pd.DataFrame):
+        files.write_atomic(self._path(id_station, kind),
+                           lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+    def years(self, id_station: str) -> list[int]:
+        """List the years the normals of a station are computed from."""
+        mtime = self._mtime(id_station, 'values')
+        if mtime is None:
+            return []
+        known = self._years.get(id_station)
+        if known is not None and known[0] == mtime:
+            return known[1]
+
+        values = self._read(id_station, 'values')
+        if values is None:
+            return []
+        years = sorted(values['YEAR'].unique().tolist())
+        self._years[id_station] = (mtime, years)
+
+        return years
+
+
+    def get(self, id_station: str) -> pd.DataFrame | None:
+        """Read the normals of a station.
+
+        Args:
+            id_station (str): station id number.
+
+        Returns:
+            pd.DataFrame | None: normals or None if no complete year has been
+            retrieved.
+        """
+        mtime = self._mtime(id_station, 'normals')
+        if mtime is None:
+            return None
+        with self._lock:
+            known = self._normals.get(id_station)
+            if known is not None and known[0] == mtime:
+                self._normals.move_to_end(id_station)
+                return known[1]
+
+        normals = self._read(id_station, 'normals')
+        if normals is not None:
+            self._keep(id_station, mtime, normals)
+
+        return normals
+
+
+    def _keep(self, id_station: str, mtime: int, normals: pd.DataFrame):
+        with self._lock:
+            self._normals[id_station] = (mtime, normals)
+            self._normals.move_to_end(id_station)
+            while len(self._normals) > self.max_stations:
+                self._normals.popitem(last=False)
+
+
+    def update(self, id_station: str,
+               frames: dict[int, pd.DataFrame]) -> pd.DataFrame | None:
+        """Add the complete years of retrieved data to the values of a station
+        and compute its normals again if some are new.
+
+        Args:
+            id_station (str): station id number ;
+            frames (dict[int, pd.DataFrame]): daily data with a 'DATE' column
+            per year.
+
+        Returns:
+            pd.DataFrame | None: normals of the station.
+        """
+        # The current year is not complete
+        current_year = datetime.now().year
+        known = set(self.years(id_station))
+        frames = {
+            year: df for year, df in frames.items()
+            if year < current_year and year not in known
+            and not df.empty and 'DATE' in df.columns
+        }
+        if not frames:
+            return self.get(id_station)
+
+        with self._lock:
+            stored = self._read(id_station, 'values')
+            # Years added by another process since the years were listed
+            if stored is not None:
+                known = set(stored['YEAR'].unique().tolist())
+            new = [df for year, df in sorted(frames.items())
+                   if year not in known]
+            if not new:
+                return self._read(id_station, 'normals')
+
+            values = [stored]
+            for df in new:
+                year_values = df.drop(columns=['POSTE', 'DATE']).astype('float32')
+                year_values.insert(0, 'YEAR', df['DATE'].dt.year.to_numpy())
+                year_values.insert(1, 'DAY', day_of_year(df['DATE']))
+                values.append(year_values.reset_index(drop=True))
+            values = pd.concat([v for v in values if v is not None],
+                               ignore_index=True)
+
+            self.folder.mkdir(parents=True, exist_ok=True)
+            normals = compute_normals(values)
+            self._write(id_station, 'values', values)
+            self._write(id_station, 'normals', normals)
+            self._years[id_station] = (
+                self._mtime(id_station, 'values'),
+                sorted(values['YEAR'].unique().tolist()))
+        self._keep(id_station, self._mtime(id_station, 'normals'), normals)
+
+        return normals
+
+
+def anomalies(data: pd.DataFrame, normals: pd.DataFrame) -> pd.DataFrame:
+    """Compute the departure of daily data from the mean of their day.
+
+    Args:
+        data (pd.DataFrame): data with 'POSTE' and 'DATE' as first columns ;
+        normals (pd.DataFrame): normals of the station.
+
+    Returns:
+        pd.DataFrame: data with the departures instead of the values, NaN for
+        the parameters without normals.
+    """
+    means = normals.pivot(index='DAY', columns='parameter', values='mean')
+    days = day_of_year(data['DATE'])
+    df = data.copy()
+    for column in data.columns[2:]:
+        if column in means.columns:
+            df[column] = data[column].to_numpy() - means[column].to_numpy()[days - 1]
+        else:
+            df[column] = np.nan
+
+    return df
+
+
+# Normals shared by every session of the application
+STORE = NormalsStore()
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
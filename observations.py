@@ -0,0 +1,156 @@
+"""
+Retrieval of the real-time observations of several stations at once.
+
+A station may not report at a given time, so the observations of the nearest
+stations are requested concurrently and the nearest one with measured values
+is kept. Waiting for them costs about one request instead of one per station.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import json
+
+import requests
+
+import constants
+from meteo_france import Client
+import ratelimit
+
+# Worker threads shared by all the observation requests of the process
+_executor = ThreadPoolExecutor(
+    max_workers=constants.OBSERVATION_WORKERS, thread_name_prefix='observation')
+
+
+class ObservationError(Exception):
+    """Raised when a station has no observation available."""
+
+
+def has_measures(observation: dict) -> bool:
+    """Check that an observation has at least one of the displayed parameters
+    measured.
+
+    Args:
+        observation (dict): observation of a station.
+
+    Returns:
+        bool: True if a parameter is measured.
+    """
+    return any(observation.get(parameter) is not None
+               for parameter in constants.OBSERVATION_PARAMETERS)
+
+
+def get_observation(id_station: str, date: str = '',
+                    client: Client | None = None) -> dict:
+    """Get the observation of a station at a date.
+
+    Args:
+        id_station (str): station id number ;
+        date (str, optional): requested date (ISO 8601 format with TZ UTC
+        AAAA-MM-JJThh:00:00Z), the last available observation if empty ;
+        client (Client | None, optional): api client.
+
+    Raises:
+        ObservationError: if the request failed or the observation has no
+        measure.
+
+    Returns:
+        dict: observation.
+    """
+    client = client or Client()
+    response = client.get_hourly_observation(id_station, date)
+
+    if response.status_code != requests.codes.ok:
+        raise ObservationError(
+            f'Echec de la récupération des données.  \n'
+            f'{response.status_code} : {response.reason}')
+    try:
+        observation = response.json()[0]
+    except (json.JSONDecodeError, IndexError, KeyError):
+        raise ObservationError('Erreur de décodage de la réponse JSON.')
+
+    if not has_measures(observation):
+        raise ObservationError(
+            f'Aucune mesure disponible pour la station {id_station}.')
+
+    return observation
+
+
+def submit_all(ids_station: list[str], date: str = '') -> list[Future]:
+    """Request the observations of several stations concurrently.
+
+    Args:
+        ids_station (list[str]): stations id numbers ;
+        date (str, optional): requested date, the last available observation
+        if empty.
+
+    Returns:
+        list[Future]: futures of the observations in the stations order.
+    """
+    client = Client()
+
+    return [_executor.submit(get_observation, id_station, date, client)
+            for id_station in ids_station]
+
+
+def first_available(ids_station: list[str], date: str = '') -> tuple[str, dict]:
+    """Get the observation of the first station of a list with measures,
+    requesting all of them concurrently.
+
+    Args:
+        ids_station (list[str]): stations id numbers, by order of preference ;
+        date (str, optional): requested date, the last available observation
+        if empty.
+
+    Raises:
+        ObservationError: if no station has an observation available, with
+        the error of the first one.
+
+    Returns:
+        tuple[str, dict]: id of the station and its observation.
+    """
+    futures = submit_all(ids_station, date)
+    errors = []
+    try:
+        for id_station, future in zip(ids_station, futures):
+            try:
+                return id_station, future.result()
+            except (ObservationError, requests.RequestException,
+                    ratelimit.RateLimitExceeded) as e:
+                errors.append(e)
+    finally:
+        # Stations after the chosen one are not needed anymore
+        for future in futures:
+            future.cancel()
+
+    raise errors[0] if errors else ObservationError('Aucune station.')
+
+
+def all_available(ids_station: list[str], date: str = '') -> dict[str, dict]:
+    """Get the observations of all the stations of a list with measures,
+    requesting them concurrently.
+
+    Args:
+        ids_station (list[str]): stations id numbers ;
+        date (str, optional): requested date, the last available observation
+        if empty.
+
+    Returns:
+        dict[str, dict]: observation per station id, in the stations order,
+        without the stations with no observation available.
+    """
+    observations = {}
+    for id_station, future in zip(ids_station, submit_all(ids_station, date)):
+        try:
+            observations[id_station] = future.result()
+        except (ObservationError, requests.RequestException,
+                ratelimit.RateLimitExceeded):
+            continue
+
+    return observations
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""
+Placement and retrieval of Météo France 'Climatological data' (DPClim) orders.
+
+An order is placed with one of the 'commande-station' endpoints which answers
+with an order id (code 202). The file is then requested with this id until it
+is ready : code 204 while the production is pending, code 201 with the data
+once done.
+
+Polling runs in a worker thread with an increasing delay between tries and a
+deadline, so that the calling thread only waits for the result and can report
+the progress to the user meanwhile.
+
+Identical orders placed at the same time by several sessions are coalesced :
+the first one is placed and polled, the other ones wait until its file is
+ready then download it themselves, each retrieval still parsing the file
+while it is downloaded.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, wait
+import threading
+import time
+from typing import Callable, Iterator
+
+import requests
+
+import constants
+from meteo_france import Client
+
+# Worker threads shared by all the orders of the process
+_executor = ThreadPoolExecutor(
+    max_workers=constants.ORDER_WORKERS, thread_name_prefix='order')
+
+
+class OrderError(Exception):
+    """Raised when an order can't be placed or its file can't be retrieved."""
+
+
+class OrderCancelled(OrderError):
+    """Raised when the retrieval of an order is cancelled."""
+
+
+class OrderProgress(object):
+    """State of an order retrieval shared between the polling thread and the
+    waiting thread."""
+
+    def __init__(self, order_id: str | None, deadline: float):
+        self.order_id = order_id
+        self.deadline = deadline
+        self.attempts = 0
+        self.status_code = None
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the retrieval started."""
+        return time.monotonic() - self.started_at
+
+
+    @property
+    def fraction(self) -> float:
+        """Elapsed part of the deadline, between 0 and 1."""
+        return min(self.elapsed / self.deadline, 1.0)
+
+
+    def start(self):
+        """Reset the start time when the retrieval actually begins."""
+        self.started_at = time.monotonic()
+
+
+    def update(self, status_code: int):
+        with self._lock:
+            self.attempts += 1
+            self.status_code = status_code
+
+
+def backoff_schedule(
+        first: float = constants.ORDER_FIRST_DELAY,
+        factor: float = constants.ORDER_BACKOFF_FACTOR,
+        maximum: float = constants.ORDER_MAX_DELAY) -> Iterator[float]:
+    """Generate the delays between two tries, growing geometrically from the
+    first delay up to the maximum one.
+
+    Args:
+        first (float, optional): first delay in seconds ;
+        factor (float, optional): growth factor between two delays ;
+        maximum (float, optional): maximum delay in seconds.
+
+    Yields:
+        Iterator[float]: delays in seconds.
+    """
+    delay = first
+    while True:
+        yield min(delay, maximum)
+        delay *= factor
+
+
+def failure_message(response: requests.Response) -> str:
+    """Message of a failed request to the DPClim api."""
+    if response.status_code == requests.codes.too_many_requests:
+        return ('Quota de requêtes de l\'API Météo France atteint, '
+                'réessayez dans quelques instants.')
+
+    return f'''Echec de la récupération des données.  
+    {response.status_code} : {response.reason}
+    '''
+
+
+def get_order_id(response: requests.Response) -> str:
+    """Extract the order id from the response of an order endpoint.
+
+    Args:
+        response (requests.Response): response of the order endpoint.
+
+    Raises:
+        OrderError: if the order hasn't been accepted.
+
+    Returns:
+        str: order id.
+    """
+    if response.status_code != 202:
+        raise OrderError(failure_message(response))
+    try:
+        return (
+            response
+            .json()
+            .get('elaboreProduitAvecDemandeResponse')
+            .get('return')
+        )
+    except (ValueError, AttributeError):
+        raise OrderError('Erreur de décodage de la réponse JSON.')
+
+
+def order_key(url: str, **params: str) -> tuple:
+    """Identify an order by its endpoint and parameters, identical orders
+    having the same key.
+
+    Args:
+        url (str): order endpoint ;
+        **params (str): parameters of the order.
+
+    Returns:
+        tuple: key of the order.
+    """
+    return (url, tuple(sorted((name, str(value).strip())
+                              for name, value in params.items())))
+
+
+class Flight(object):
+    """Order in flight shared by the identical retrievals."""
+
+    def __init__(self):
+        self.order_id = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SharedOrders(object):
+    """Orders in flight of the process, by key."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+
+    def join(self, key: tuple) -> tuple[Flight, bool]:
+        """Join the flight of an order, starting it if there is none.
+
+        Args:
+            key (tuple): key of the order, see 'order_key'.
+
+        Returns:
+            tuple[Flight, bool]: flight and True if the caller has started it
+            and has to place the order.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+
+        return flight, True
+
+
+    def land(self, key: tuple, flight: Flight,
+             error: BaseException | None = None):
+        """End a flight once the file of the order is ready or with its error,
+        and wake up the retrievals waiting for it."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.error = error
+        flight.done.set()
+
+
+    def in_flight(self) -> int:
+        """Count the orders in flight."""
+        with self._lock:
+            return len(self._flights)
+
+
+# Orders in flight shared by every session of the process
+SHARED_ORDERS = SharedOrders()
+
+
+class OrderRetriever(object):
+    """Retrieve the file of an order with adaptive polling and a deadline."""
+
+    def __init__(self, client: Client | None = None,
+                 deadline: float = constants.ORDER_DEADLINE,
+                 schedule: Callable[[], Iterator[float]] = backoff_schedule,
+                 stream: bool = False,
+                 cancel: threading.Event | None = None):
+        self.client = client or Client()
+        self.deadline = deadline
+        self.schedule = schedule
+        # Files are returned unread, to be parsed while downloaded
+        self.stream = stream
+        # Set to stop the retrievals between two tries
+        self.cancel = cancel
+
+
+    def _check_cancelled(self, order_id: str | None):
+        if self.cancel is not None and self.cancel.is_set():
+            raise OrderCancelled(f'La commande {order_id} a été annulée.')
+
+
+    def _sleep(self, delay: float):
+        if self.cancel is not None:
+            self.cancel.wait(delay)
+        else:
+            time.sleep(delay)
+
+
+    def recover(self, order_id: str,
+                progress: OrderProgress | None = None) -> requests.Response:
+        """Poll the order until its file is ready. This call is blocking.
+
+        Args:
+            order_id (str): id of the order ;
+            progress (OrderProgress | None, optional): state to update after
+            each try.
+
+        Raises:
+            OrderError: if the file is not ready before the deadline or if the
+            production failed ;
+            OrderCancelled: if the retrieval is cancelled.
+
+        Returns:
+            requests.Response: response from the API with the data in csv.
+        """
+        progress = progress or OrderProgress(order_id, self.deadline)
+        delays = self.schedule()
+
+        while True:
+            self._check_cancelled(order_id)
+            response = self.client.order_recovery(order_id, stream=self.stream)
+            progress.update(response.status_code)
+
+            if response.status_code == 201:
+                return response
+            # Give the connection back to the pool
+            response.close()
+            if response.status_code != 204:
+                raise OrderError(failure_message(response))
+
+            remaining = self.deadline - progress.elapsed
+            if remaining <= 0:
+                raise OrderError(
+                    f'Les données de la commande {order_id} ne sont pas '
+                    f'disponibles après {self.deadline:.0f} secondes.')
+            self._sleep(min(next(delays), remaining))
+
+
+    def order(self, place: Callable[[], requests.Response],
+              progress: OrderProgress | None = None,
+              key: tuple | None = None) -> requests.Response:
+        """Place an order then poll it until its file is ready. This call is
+        blocking.
+
+        With a key, an identical order already in flight is waited for instead
+        of being placed again, its file being downloaded once ready.
+
+        Args:
+            place (Callable[[], requests.Response]): call to the order endpoint ;
+            progress (OrderProgress | None, optional): state to update after
+            each try ;
+            key (tuple | None, optional): key of the order, see 'order_key'.
+
+        Returns:
+            requests.Response: response from the API with the data in csv.
+        """
+        progress = progress or OrderProgress(None, self.deadline)
+        # Time spent queued for a worker doesn't count in the deadline
+        progress.start()
+        if key is not None:
+            return self._shared_order(place, progress, key)
+
+        self._check_cancelled(None)
+        progress.order_id = get_order_id(place())
+
+        return self.recover(progress.order_id, progress)
+
+
+    def _shared_order(self, place: Callable[[], requests.Response],
+                      progress: OrderProgress, key: tuple) -> requests.Response:
+        while True:
+            self._check_cancelled(progress.order_id)
+            flight, leader = SHARED_ORDERS.join(key)
+            if leader:
+                try:
+                    progress.order_id = get_order_id(place())
+                    flight.order_id = progress.order_id
+                    response = self.recover(progress.order_id, progress)
+                except BaseException as e:
+                    SHARED_ORDERS.land(key, flight, error=e)
+                    raise
+                # The file is ready, the other retrievals download it
+                # themselves while this one is parsing its response
+                SHARED_ORDERS.land(key, flight)
+
+                return response
+
+            # Wait for the order placed by another retrieval
+            while not flight.done.wait(constants.ORDER_PROGRESS_INTERVAL):
+                progress.order_id = flight.order_id
+                self._check_cancelled(progress.order_id)
+                if progress.elapsed >= self.deadline:
+                    raise OrderError(
+                        f'Les données de la commande {progress.order_id} ne '
+                        f'sont pas disponibles après {self.deadline:.0f} '
+                        f'secondes.')
+            progress.order_id = flight.order_id
+            if isinstance(flight.error, OrderCancelled):
+                # Cancelled by the retrieval which placed it, order again
+                continue
+            if flight.error is not None:
+                raise flight.error
+
+            # Ready, the first try gets the file
+            return self.recover(flight.order_id, progress)
+
+
+    def submit_order(self, place: Callable[[], requests.Response],
+                     key: tuple | None = None) -> tuple:
+        """Place an order and poll it in a worker thread.
+
+        Args:
+            place (Callable[[], requests.Response]): call to the order endpoint ;
+            key (tuple | None, optional): key of the order to share it with the
+            identical retrievals in flight, see 'order_key'.
+
+        Returns:
+            tuple: future of the response and its progress state.
+        """
+        progress = OrderProgress(None, self.deadline)
+        future = _executor.submit(self.order, place, progress, key)
+
+        return future, progress
+
+
+    def submit(self, order_id: str) -> tuple:
+        """Start polling the order in a worker thread.
+
+        Args:
+            order_id (str): id of the order.
+
+        Returns:
+            tuple: future of the response and its progress state.
+        """
+        progress = OrderProgress(order_id, self.deadline)
+        future = _executor.submit(self.recover, order_id, progress)
+
+        return future, progress
+
+
+    def wait(self, order_id: str,
+             on_progress: Callable[[OrderProgress], None] | None = None
+             ) -> requests.Response:
+        """Retrieve the file of an order, polling in a worker thread while the
+        calling thread reports the progress.
+
+        Args:
+            order_id (str): id of the order ;
+            on_progress (Callable[[OrderProgress], None] | None, optional):
+            called regularly with the progress state while waiting.
+
+        Returns:
+            requests.Response: response from the API with the data in csv.
+        """
+        return self._wait(*self.submit(order_id), on_progress)
+
+
+    def wait_order(self, place: Callable[[], requests.Response],
+                   key: tuple | None = None,
+                   on_progress: Callable[[OrderProgress], None] | None = None
+                   ) -> requests.Response:
+        """Place an order and retrieve its file, polling in a worker thread
+        while the calling thread reports the progress.
+
+        Args:
+            place (Callable[[], requests.Response]): call to the order endpoint ;
+            key (tuple | None, optional): key of the order, see 'order_key' ;
+            on_progress (Callable[[OrderProgress], None] | None, optional):
+            called regularly with the progress state while waiting.
+
+        Returns:
+            requests.Response: response from the API with the data in csv.
+        """
+        return self._wait(*self.submit_order(place, key), on_progress)
+
+
+    def _wait(self, future: Future, progress: OrderProgress,
+              on_progress: Callable[[OrderProgress], None] | None
+              ) -> requests.Response:
+        while True:
+            try:
+                return future.result(timeout=constants.ORDER_PROGRESS_INTERVAL)
+            except TimeoutError:
+                if on_progress is not None:
+                    on_progress(progress)
+
+
+def wait_all(jobs: list[tuple[Future, OrderProgress]],
+             on_progress: Callable[[list[OrderProgress]], None] | None = None
+             ) -> list[requests.Response]:
+    """Wait for several orders submitted to the worker threads, reporting
+    their progress meanwhile.
+
+    Args:
+        jobs (list[tuple[Future, OrderProgress]]): futures and progress states
+        returned by 'OrderRetriever.submit' or 'OrderRetriever.submit_order' ;
+        on_progress (Callable[[list[OrderProgress]], None] | None, optional):
+        called regularly with the progress states while waiting.
+
+    Raises:
+        OrderError: as soon as one of the orders fails.
+
+    Returns:
+        list[requests.Response]: responses in the order of the jobs.
+    """
+    futures = [future for future, _ in jobs]
+
+    while True:
+        done, pending = wait(futures, timeout=constants.ORDER_PROGRESS_INTERVAL)
+        for future in done:
+            if future.exception() is not None:
+                for other in pending:
+                    other.cancel()
+                raise future.exception()
+        if not pending:
+            break
+        if on_progress is not None:
+            on_progress([progress for _, progress in jobs])
+
+    return [future.result() for future in futures]
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Parsers of the csv files returned by the DPClim orders.
+
+The files use semicolons as separator and commas as decimal separator. Reading
+them directly with the right decimal separator and a dtype for each column
+avoids the conversion of every value from text afterwards, and only the
+requested parameters are kept. Large files are parsed from the response
+stream while they are downloaded, by chunks of rows for the longest ones.
+"""
+
+from io import StringIO, TextIOWrapper
+from functools import lru_cache
+from typing import IO, Iterator
+
+import pandas as pd
+import requests
+
+import constants
+
+DAILY_DATE_FORMAT = '%Y%m%d'
+HOURLY_DATE_FORMAT = '%Y%m%d%H'
+
+
+@lru_cache(maxsize=1)
+def daily_parameters() -> pd.DataFrame:
+    """Read the table of the daily climatological parameters.
+
+    Returns:
+        pd.DataFrame: parameters with their label, unit and category.
+    """
+    return pd.read_csv(constants.DAILY_PARAMETERS_PATH, sep=';')
+
+
+def categorized_parameters() -> list[str]:
+    """List the daily parameters displayed in the application, which are the
+    ones with a category.
+
+    Returns:
+        list[str]: parameters.
+    """
+    df = daily_parameters()
+
+    return df.loc[df['parameter_category'].notna(), 'parameter'].tolist()
+
+
+def daily_dtypes(parameters: list[str] | None = None) -> dict:
+    """Build the dtype of each column of a daily file from the parameters
+    table. Values have one decimal at most so float32 keeps them exactly
+    enough, whatever their unit.
+
+    Args:
+        parameters (list[str] | None, optional): parameters to keep, all
+        the parameters of the table if None.
+
+    Returns:
+        dict: dtype per column.
+    """
+    if parameters is None:
+        parameters = daily_parameters()['parameter'].tolist()
+
+    dtypes = {'POSTE': 'int64', 'DATE': 'object'}
+    dtypes.update({parameter: 'float32' for parameter in parameters})
+
+    return dtypes
+
+
+def stream_text(response: requests.Response) -> IO:
+    """Read the body of a streamed response as a text file, decoded while it
+    is downloaded, instead of loading it whole in memory.
+
+    Args:
+        response (requests.Response): response requested with stream=True.
+
+    Returns:
+        IO: text file-like object.
+    """
+    # Uncompress the body if it has been sent compressed, and keep the stream
+    # open at its end for the text wrapper
+    response.raw.decode_content = True
+    response.raw.auto_close = False
+
+    return TextIOWrapper(response.raw, encoding=response.encoding or 'utf-8')
+
+
+def _csv_options(dtypes: dict | None) -> dict:
+    """Options of 'pd.read_csv' to keep only the columns of the dtypes map, or
+    all the columns if None."""
+    if dtypes is None:
+        return {'dtype': {'POSTE': 'int64', 'DATE': 'object'}}
+
+    return {'usecols': lambda column: column in dtypes, 'dtype': dtypes}
+
+
+def _read(source: str | IO, dtypes: dict | None,
+          date_format: str) -> pd.DataFrame:
+    """Read a DPClim csv file keeping only the columns of the dtypes map.
+
+    Args:
+        source (str | IO): content of the file or file-like object ;
+        dtypes (dict | None): dtype per column to keep, all the columns if
+        None ;
+        date_format (str): format of the 'DATE' column.
+
+    Returns:
+        pd.DataFrame: data with the 'DATE' column parsed.
+    """
+    if isinstance(source, str):
+        source = StringIO(source)
+
+    df = pd.read_csv(source, sep=';', decimal=',', **_csv_options(dtypes))
+    df['DATE'] = pd.to_datetime(df['DATE'], format=date_format)
+
+    return df
+
+
+def _read_chunks(source: str | IO, dtypes: dict | None, date_format: str,
+                 chunksize: int) -> Iterator[pd.DataFrame]:
+    """Read a DPClim csv file by chunks of rows, keeping only the columns of
+    the dtypes map.
+
+    Args:
+        source (str | IO): content of the file or file-like object ;
+        dtypes (dict | None): dtype per column to keep, all the columns if
+        None ;
+        date_format (str): format of the 'DATE' column ;
+        chunksize (int): number of rows per chunk.
+
+    Yields:
+        Iterator[pd.DataFrame]: data with the 'DATE' column parsed.
+    """
+    if isinstance(source, str):
+        source = StringIO(source)
+
+    with pd.read_csv(source, sep=';', decimal=',', chunksize=chunksize,
+                     **_csv_options(dtypes)) as reader:
+        for df in reader:
+            df['DATE'] = pd.to_datetime(df['DATE'], format=date_format)
+            yield df
+
+
+def parse_daily(source: str | IO,
+                parameters: list[str] | None = None) -> pd.DataFrame:
+    """Parse the csv file of a daily climatological data order.
+
+    Args:
+        source (str | IO): content of the file or file-like object ;
+        parameters (list[str] | None, optional): parameters to keep, all
+        the parameters of the table if None.
+
+    Returns:
+        pd.DataFrame: climatological data without the parameters which are
+        never measured.
+    """
+    df = _read(source, daily_dtypes(parameters), DAILY_DATE_FORMAT)
+    # Remove all variables with only NaN
+    df = df.dropna(axis='columns', how='all')
+
+    return df
+
+
+def _to_float32(df: pd.DataFrame) -> pd.DataFrame:
+    values = df.columns.difference(['POSTE', 'DATE'])
+
+    return df.astype({column: 'float32' for column in values})
+
+
+def parse_hourly(source: str | IO,
+                 parameters: list[str] | None = None) -> pd.DataFrame:
+    """Parse the csv file of an hourly climatological data order.
+
+    Args:
+        source (str | IO): content of the file or file-like object ;
+        parameters (list[str] | None, optional): parameters to keep, all the
+        columns of the file if None.
+
+    Returns:
+        pd.DataFrame: climatological data.
+    """
+    if parameters is None:
+        # Long series are stored so values are kept in float32 like the
+        # daily ones
+        return _to_float32(_read(source, None, HOURLY_DATE_FORMAT))
+
+    # Few rows are displayed as is so values are kept in float64
+    dtypes = {'POSTE': 'int64', 'DATE': 'object'}
+    dtypes.update({parameter: 'float64' for parameter in parameters})
+
+    return _read(source, dtypes, HOURLY_DATE_FORMAT)
+
+
+def iter_hourly(source: str | IO,
+                chunksize: int = constants.PARSE_CHUNK_ROWS
+                ) -> Iterator[pd.DataFrame]:
+    """Parse the csv file of an hourly climatological data order by chunks of
+    rows, with all its columns and values in float32, so that long series
+    are never whole in memory.
+
+    Args:
+        source (str | IO): content of the file or file-like object ;
+        chunksize (int, optional): number of rows per chunk.
+
+    Yields:
+        Iterator[pd.DataFrame]: climatological data.
+    """
+    for df in _read_chunks(source, None, HOURLY_DATE_FORMAT, chunksize):
+        yield _to_float32(df)
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Background retrieval of the data a user is likely to request next.
+
+When a station is selected, the slow DPClim orders of the default choices of
+the page are placed in the background, so that their data are ready or on the
+way when the user asks for them. Each session has its own prefetcher, which
+cancels its retrievals when the selection changes and caps the number of
+retrievals in flight.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable
+import threading
+
+import constants
+import ratelimit
+
+# Worker threads shared by the prefetchers of all the sessions
+_executor = ThreadPoolExecutor(
+    max_workers=constants.PREFETCH_WORKERS, thread_name_prefix='prefetch')
+
+
+def _run_in_background(fn: Callable, *args, **kwargs) -> object:
+    # The clients created by the retrieval leave a reserve of the quotas to
+    # the interactive requests
+    with ratelimit.background():
+        return fn(*args, **kwargs)
+
+
+class Prefetcher(object):
+    """Retrievals started in the background for the selection of a session.
+
+    The functions run get a 'cancel' keyword argument, an event set when the
+    selection changes, to stop waiting for their orders, and their requests
+    have the background priority.
+    """
+
+    def __init__(self, max_in_flight: int = constants.PREFETCH_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.selection = None
+        self._jobs = {}
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+
+    def select(self, selection: Hashable) -> bool:
+        """Change the selection the retrievals are made for, cancelling the
+        ones of the previous selection.
+
+        Args:
+            selection (Hashable): new selection, e.g. a station id.
+
+        Returns:
+            bool: True if the selection has changed.
+        """
+        with self._lock:
+            if selection == self.selection:
+                return False
+            self._cancel_all()
+            self.selection = selection
+
+        return True
+
+
+    def cancel(self):
+        """Cancel every retrieval and forget the selection."""
+        with self._lock:
+            self._cancel_all()
+            self.selection = None
+
+
+    def _cancel_all(self):
+        self._cancel.set()
+        for future in self._jobs.values():
+            future.cancel()
+        self._jobs = {}
+        self._cancel = threading.Event()
+
+
+    def in_flight(self) -> int:
+        """Count the retrievals not done yet."""
+        return sum(not future.done() for future in self._jobs.values())
+
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> bool:
+        """Start a retrieval in the background unless it has already been
+        started or too many are in flight.
+
+        Args:
+            key (Hashable): identifier of the retrieval ;
+            fn (Callable): retrieval function, called with the arguments and a
+            'cancel' event ;
+            *args: arguments of the function.
+
+        Returns:
+            bool: True if the retrieval has been started.
+        """
+        with self._lock:
+            if key in self._jobs or self.in_flight() >= self.max_in_flight:
+                return False
+            self._jobs[key] = _executor.submit(
+                _run_in_background, fn, *args, cancel=self._cancel)
+
+        return True
+
+
+    def result(self, key: Hashable,
+               timeout: float | None = constants.ORDER_DEADLINE) -> object | None:
+        """Get the result of a retrieval, waiting for it if it is in flight.
+
+        A retrieval still in flight after the wait is kept, so that its result
+        can be got later.
+
+        Args:
+            key (Hashable): identifier of the retrieval ;
+            timeout (float | None, optional): maximum wait in seconds, 0 to
+            only get the result of a retrieval already done.
+
+        Returns:
+            object | None: result or None if the retrieval has not been
+            started, is still in flight or has failed, the caller retrieving
+            the data itself.
+        """
+        with self._lock:
+            future: Future | None = self._jobs.get(key)
+        if future is None:
+            return None
+
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            # Timed out, cancelled or failed
+            return None
+        finally:
+            if future.done():
+                with self._lock:
+                    if self._jobs.get(key) is future:
+                        del self._jobs[key]
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Rate limiting of the requests to the Météo France apis.
+
+The portal enforces a quota of requests per minute for each api of an
+application. Every request of the process takes a token from the bucket of its
+api, refilled at the rate of the quota, and waits when the bucket is empty.
+Endpoints can have a budget of their own within the quota of their api, e.g.
+so that the orders placed leave room to the retrieval of their files : their
+requests take a token from both buckets.
+Buckets live in memory, or in a SQLite file shared by the processes of the
+application when the METEOVIZ_RATE_LIMIT_DB environment variable gives its
+path.
+
+Background work (prefetch, bulk downloads) leaves a reserve of tokens to the
+interactive requests so that a user never waits behind it.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import constants
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_priority = ContextVar('priority', default=INTERACTIVE)
+
+
+def current_priority() -> str:
+    """Priority of the requests of the current context."""
+    return _priority.get()
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Give the background priority to the clients created in the context."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request can't get a token before the maximum wait."""
+
+
+def api_name(url: str) -> str | None:
+    """Name of the Météo France api of an url, e.g. 'DPClim', None for the
+    urls without quota."""
+    match = re.search(r'/public/(DP\w+)/', url)
+
+    return match.group(1) if match else None
+
+
+def budget_names(url: str) -> list[str]:
+    """Names of the budgets an url may be subject to, its endpoint first, e.g.
+    ['DPClim/commande/fichier', 'DPClim'], none for the urls without quota."""
+    match = re.search(r'/public/(DP\w+)/(?:v\d+/)?([^?#]*)', url)
+    if not match:
+        return []
+    api, endpoint = match.group(1), match.group(2).strip('/')
+
+    return [f'{api}/{endpoint}', api] if endpoint else [api]
+
+
+class MemoryBuckets(object):
+    """Token buckets of the process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+
+    def take(self, name: str, rate: float, capacity: float,
+             reserve: float) -> float:
+        """Take a token from a bucket if more than the reserve is left.
+
+        Args:
+            name (str): bucket ;
+            rate (float): tokens added per second ;
+            capacity (float): maximum tokens ;
+            reserve (float): tokens to leave in the bucket.
+
+        Returns:
+            float: 0 if a token has been taken, otherwise the seconds before
+            one can be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(name, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1 + reserve:
+                self._buckets[name] = (tokens - 1, now)
+                return 0.0
+            self._buckets[name] = (tokens, now)
+
+            return (1 + reserve - tokens) / rate
+
+
+class SQLiteBuckets(object):
+    """Token buckets shared by the processes through a SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets '
+                '(name TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10,
+                                         isolation_level=None)
+            self._local.connection = connection
+
+        return connection
+
+
+    def take(self, name: str, rate: float, capacity: float,
+             reserve: float) -> float:
+        """Take a token from a bucket if more than the reserve is left, see
+        'MemoryBuckets.take'."""
+        connection = self._connect()
+        # Lock the file for writing so that two processes don't take the
+        # same token
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = connection.execute(
+                'SELECT tokens, updated FROM buckets WHERE name = ?',
+                (name,)).fetchone()
+            tokens, updated = row if row is not None else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1 + reserve:
+                tokens -= 1
+            else:
+                wait = (1 + reserve - tokens) / rate
+            connection.execute(
+                'INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)',
+                (name, tokens, now))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        return wait
+
+
+class RateLimiter(object):
+    """Token bucket per api in front of the requests.
+
+    Args:
+        budgets (dict[str, float]): requests per minute of each api, or of an
+        endpoint named after its api and path, e.g. 'DPClim/commande/fichier' ;
+        buckets (MemoryBuckets | SQLiteBuckets): store of the buckets ;
+        burst (float, optional): maximum tokens of a bucket ;
+        reserve (float, optional): tokens background requests leave to the
+        interactive ones ;
+        max_wait (float, optional): maximum wait for a token in seconds.
+    """
+
+    def __init__(self, budgets: dict[str, float],
+                 buckets: MemoryBuckets | SQLiteBuckets,
+                 burst: float = constants.RATE_LIMIT_BURST,
+                 reserve: float = constants.RATE_LIMIT_RESERVE,
+                 max_wait: float = constants.RATE_LIMIT_MAX_WAIT):
+        self.budgets = budgets
+        self.buckets = buckets
+        self.burst = burst
+        self.reserve = reserve
+        self.max_wait = max_wait
+
+
+    def acquire(self, url: str, priority: str = INTERACTIVE) -> float:
+        """Wait for a token of the endpoint of an url and of its api.
+
+        Args:
+            url (str): requested url ;
+            priority (str, optional): INTERACTIVE or BACKGROUND.
+
+        Raises:
+            RateLimitExceeded: if no token is available before the maximum
+            wait.
+
+        Returns:
+            float: seconds waited.
+        """
+        reserve = self.reserve if priority == BACKGROUND else 0.0
+        start = time.monotonic()
+        for name in budget_names(url):
+            if name in self.budgets:
+                self._take(name, reserve, start)
+
+        return time.monotonic() - start
+
+
+    def _take(self, name: str, reserve: float, start: float):
+        rate = self.budgets[name] / 60
+        while True:
+            wait = self.buckets.take(name, rate, self.burst, reserve)
+            if wait == 0:
+                return
+            waited = time.monotonic() - start
+            if waited + wait > self.max_wait:
+                raise RateLimitExceeded(
+                    f'Quota de requêtes de l\'API {name.split("/")[0]} '
+                    f'atteint, réessayez dans quelques instants.')
+            time.sleep(wait)
+
+
+def _build_limiter() -> RateLimiter:
+    path = os.environ.get('METEOVIZ_RATE_LIMIT_DB')
+    buckets = SQLiteBuckets(path) if path else MemoryBuckets()
+
+    return RateLimiter(constants.RATE_LIMITS, buckets)
+
+
+# Rate limiter shared by every client of the process
+RATE_LIMITER = _build_limiter()
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,514 @@
+"""
+In-memory catalogue of the Météo France observation stations.
+
+The stations list csv file is parsed once per process with compact dtypes and
+shared by every session of the Streamlit application, along with the
+precomputed commune of each station. The files are watched through their
+modification time and size so that a list regenerated by
+'utils.download_station_list_to_csv' is reloaded on the next access, the
+sessions using the previous catalogue until the new one is loaded.
+
+The parsed list and the coordinates of the spatial index are also stored in a
+Parquet sidecar file, tagged with the hash of the csv file it comes from, so
+that the processes load them without parsing the csv file. A new list is
+published by writing the sidecar then the csv file, each in a temporary file
+renamed over the previous one, so that a reader never sees a partial file.
+"""
+
+from pathlib import Path
+import hashlib
+import io
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import constants
+import files
+
+STATION_DTYPES = {
+    'Id_station': 'object',
+    'Id_omm': 'Int32',
+    'Nom_usuel': 'object',
+    'Latitude': 'float32',
+    'Longitude': 'float32',
+    'Altitude': 'int16',
+    'Pack': 'category'
+}
+# Unit sphere coordinates of the spatial index in the sidecar file
+INDEX_COLUMNS = ['_x', '_y', '_z']
+SIDECAR_METADATA_KEY = b'meteoviz'
+
+
+def _to_unit_sphere(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Convert latitudes and longitudes in degrees to cartesian coordinates on
+    the unit sphere.
+
+    Args:
+        lat (np.ndarray): latitudes in degrees ;
+        lon (np.ndarray): longitudes in degrees.
+
+    Returns:
+        np.ndarray: array of shape (n, 3) with x, y and z coordinates.
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+
+    return np.column_stack((
+        np.cos(lat) * np.cos(lon),
+        np.cos(lat) * np.sin(lon),
+        np.sin(lat)
+    ))
+
+
+class StationIndex(object):
+    """Spatial index of the observation stations.
+
+    Stations are stored as unit vectors so that great-circle distances to all
+    of them are computed in one vectorized operation. The few stations close
+    enough to the nearest one to possibly win on the ellipsoid are then
+    compared with the exact geodesic distance, which gives the same result as
+    computing the geodesic distance for every station.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray,
+                 xyz: np.ndarray | None = None):
+        self.lat = np.asarray(lat, dtype='float64')
+        self.lon = np.asarray(lon, dtype='float64')
+        # Coordinates precomputed in the sidecar file are used as they are
+        self.xyz = (_to_unit_sphere(self.lat, self.lon) if xyz is None
+                    else np.asarray(xyz, dtype='float64'))
+
+
+    def great_circle_distances(self, lat_lon: list) -> np.ndarray:
+        """Compute the great-circle distance to every station.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from.
+
+        Returns:
+            np.ndarray: distances in km.
+        """
+        point = _to_unit_sphere(np.array([lat_lon[0]]), np.array([lat_lon[1]]))[0]
+        chord = np.linalg.norm(self.xyz - point, axis=1)
+
+        return (2 * constants.EARTH_RADIUS_KM
+                * np.arcsin(np.clip(chord / 2, 0, 1)))
+
+
+    def _by_geodesic(self, lat_lon: list,
+                     candidates: np.ndarray) -> list[tuple[int, float]]:
+        """Sort candidate stations by their exact geodesic distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from ;
+            candidates (np.ndarray): positions of the candidates in index
+            order.
+
+        Returns:
+            list[tuple[int, float]]: positions and geodesic distances in km.
+        """
+        # Loaded on the first lookup, geopy being long to import
+        from geopy import distance
+
+        geodesic = [
+            (int(i), distance.distance([self.lat[i], self.lon[i]], lat_lon).km)
+            for i in candidates
+        ]
+        # The sort is stable so ties resolve in index order like 'nsmallest'
+        return sorted(geodesic, key=lambda x: x[1])
+
+
+    def k_nearest(self, lat_lon: list, k: int) -> list[tuple[int, float]]:
+        """Find the k nearest stations calculated with geodesic distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from ;
+            k (int): number of stations.
+
+        Returns:
+            list[tuple[int, float]]: positions of the stations in the index
+            and their geodesic distances in km, nearest first.
+        """
+        great_circle = self.great_circle_distances(lat_lon)
+        k = min(k, len(great_circle))
+        kth = np.partition(great_circle, k - 1)[k - 1]
+        # Keep every station which could be among the k nearest on the ellipsoid
+        threshold = kth * (1 + constants.GEODESIC_TOLERANCE)
+        candidates = np.flatnonzero(great_circle <= threshold)
+
+        return self._by_geodesic(lat_lon, candidates)[:k]
+
+
+    def within(self, lat_lon: list, radius_km: float) -> list[tuple[int, float]]:
+        """Find the stations within a radius calculated with geodesic distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from ;
+            radius_km (float): radius in km.
+
+        Returns:
+            list[tuple[int, float]]: positions of the stations in the index
+            and their geodesic distances in km, nearest first.
+        """
+        great_circle = self.great_circle_distances(lat_lon)
+        threshold = radius_km * (1 + constants.GEODESIC_TOLERANCE)
+        candidates = np.flatnonzero(great_circle <= threshold)
+
+        return [(i, km) for i, km in self._by_geodesic(lat_lon, candidates)
+                if km <= radius_km]
+
+
+    def nearest(self, lat_lon: list) -> tuple[int, float]:
+        """Find the nearest station calculated with geodesic distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from.
+
+        Returns:
+            tuple[int, float]: position of the nearest station in the index
+            and its geodesic distance in km.
+        """
+        return self.k_nearest(lat_lon, 1)[0]
+
+
+def content_hash(content: bytes) -> str:
+    """Hash of the content of a stations list file."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def parse_station_list(source: str | Path | io.BytesIO) -> pd.DataFrame:
+    """Parse a stations list csv file.
+
+    Args:
+        source (str | Path | io.BytesIO): path or content of the file.
+
+    Returns:
+        pd.DataFrame: stations with the full precision coordinates.
+    """
+    return pd.read_csv(
+        source,
+        sep=';',
+        dtype={'Id_station': object},
+        parse_dates=['Date_ouverture']
+    )
+
+
+def write_sidecar(df: pd.DataFrame, csv_hash: str,
+                  path: str | Path = constants.WEATHER_STATION_SIDECAR_PATH,
+                  etag: str | None = None):
+    """Store a parsed stations list with the coordinates of its spatial index.
+
+    Args:
+        df (pd.DataFrame): stations as parsed from the csv file ;
+        csv_hash (str): hash of the csv file ;
+        path (str | Path, optional): sidecar file ;
+        etag (str | None, optional): ETag of the list given by the API.
+    """
+    df = df.copy()
+    df[INDEX_COLUMNS] = _to_unit_sphere(df['Latitude'].to_numpy('float64'),
+                                        df['Longitude'].to_numpy('float64'))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SIDECAR_METADATA_KEY] = json.dumps(
+        {'sha256': csv_hash, 'etag': etag})
+    table = table.replace_schema_metadata(metadata)
+
+    files.write_atomic(path, lambda tmp_path: pq.write_table(table, tmp_path))
+
+
+def sidecar_metadata(
+        path: str | Path = constants.WEATHER_STATION_SIDECAR_PATH) -> dict:
+    """Read the hash of the csv file and the ETag a sidecar file comes from.
+
+    Returns:
+        dict: 'sha256' and 'etag' keys, empty if there is no valid sidecar.
+    """
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+        return json.loads(metadata[SIDECAR_METADATA_KEY])
+    except (OSError, KeyError, ValueError, pa.ArrowInvalid):
+        return {}
+
+
+def load_station_list(
+        path: str | Path = constants.WEATHER_STATION_LIST_PATH,
+        sidecar_path: str | Path = constants.WEATHER_STATION_SIDECAR_PATH
+        ) -> tuple[pd.DataFrame, np.ndarray]:
+    """Load a stations list from its sidecar file if it is up to date,
+    otherwise parse the csv file and write the sidecar for the next loads.
+
+    Args:
+        path (str | Path, optional): csv file ;
+        sidecar_path (str | Path, optional): sidecar file.
+
+    Returns:
+        tuple[pd.DataFrame, np.ndarray]: stations and unit sphere
+        coordinates of the spatial index.
+    """
+    content = Path(path).read_bytes()
+    csv_hash = content_hash(content)
+    metadata = sidecar_metadata(sidecar_path)
+    if metadata.get('sha256') == csv_hash:
+        try:
+            df = pd.read_parquet(sidecar_path)
+            return df.drop(columns=INDEX_COLUMNS), df[INDEX_COLUMNS].to_numpy()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    df = parse_station_list(io.BytesIO(content))
+    try:
+        # Keep the ETag of the last download for the conditional requests
+        write_sidecar(df, csv_hash, sidecar_path, metadata.get('etag'))
+    except OSError:
+        # Read-only deployments parse the csv file in each process
+        pass
+
+    return df, None
+
+
+def tag_station_list(
+        etag: str | None,
+        path: str | Path = constants.WEATHER_STATION_LIST_PATH,
+        sidecar_path: str | Path = constants.WEATHER_STATION_SIDECAR_PATH):
+    """Record in the sidecar file the ETag given by the API for the current
+    stations list, writing the sidecar if needed.
+
+    Args:
+        etag (str | None): ETag of the list given by the API ;
+        path (str | Path, optional): csv file ;
+        sidecar_path (str | Path, optional): sidecar file.
+    """
+    content = Path(path).read_bytes()
+    write_sidecar(parse_station_list(io.BytesIO(content)),
+                  content_hash(content), sidecar_path, etag)
+
+
+def publish_station_list(
+        content: bytes,
+        path: str | Path = constants.WEATHER_STATION_LIST_PATH,
+        sidecar_path: str | Path = constants.WEATHER_STATION_SIDECAR_PATH,
+        etag: str | None = None) -> dict[str, list[str]]:
+    """Replace the stations list with a new one, writing its sidecar first.
+
+    Args:
+        content (bytes): content of the new csv file ;
+        path (str | Path, optional): csv file ;
+        sidecar_path (str | Path, optional): sidecar file ;
+        etag (str | None, optional): ETag of the list given by the API.
+
+    Returns:
+        dict[str, list[str]]: ids of the 'added' and 'removed' stations.
+    """
+    path = Path(path)
+    new = parse_station_list(io.BytesIO(content))
+    previous = parse_station_list(path) if path.exists() else new.iloc[:0]
+
+    write_sidecar(new, content_hash(content), sidecar_path, etag)
+    files.write_atomic(path, lambda tmp_path: tmp_path.write_bytes(content))
+
+    new_ids = set(new['Id_station'])
+    previous_ids = set(previous['Id_station'])
+
+    return {'added': sorted(new_ids - previous_ids),
+            'removed': sorted(previous_ids - new_ids)}
+
+
+class StationCatalogue(object):
+    """Stations list loaded in memory with compact dtypes, lookups by id and
+    by position and a spatial index."""
+
+    def __init__(
+            self,
+            path: str | Path = constants.WEATHER_STATION_LIST_PATH,
+            communes_path: str | Path = constants.STATION_COMMUNES_PATH,
+            sidecar_path: str | Path = constants.WEATHER_STATION_SIDECAR_PATH):
+        self.path = Path(path)
+        self.communes_path = Path(communes_path)
+        self.stamp = self.current_stamp()
+
+        df, xyz = load_station_list(self.path, sidecar_path)
+        # Build the index from the full precision coordinates
+        self.index = StationIndex(df['Latitude'], df['Longitude'], xyz)
+
+        df = df.astype({k: v for k, v in STATION_DTYPES.items()
+                        if k in df.columns})
+        df.columns = df.columns.str.lower()
+        df['nom_usuel'] = df['nom_usuel'].str.title()
+
+        # Add the precomputed communes of the stations if available
+        if self.communes_path.exists():
+            communes = pd.read_csv(self.communes_path, sep=';',
+                                   dtype='object', keep_default_na=False)
+            df = df.merge(communes[['id_station', 'city', 'context']],
+                          on='id_station', how='left')
+            # Stations missing from the table are looked up live
+            columns = ['city', 'context']
+            df[columns] = df[columns].astype('object').where(
+                df[columns].notna(), None)
+        self.df = df.reset_index(drop=True)
+
+        self._positions = pd.Index(self.df['id_station'])
+
+
+    def current_stamp(self) -> tuple:
+        """Identify the versions of the files the catalogue is loaded from."""
+        return _file_stamp(self.path), _file_stamp(self.communes_path)
+
+
+    def __len__(self) -> int:
+        return len(self.df.index)
+
+
+    def by_position(self, position: int) -> dict:
+        """Get a station information from its position in the catalogue.
+
+        Args:
+            position (int): position of the station.
+
+        Returns:
+            dict: station information.
+        """
+        station_info = self.df.iloc[[position]].to_dict('records')[0]
+        # Give back the full precision coordinates kept by the index
+        station_info['latitude'] = float(self.index.lat[position])
+        station_info['longitude'] = float(self.index.lon[position])
+
+        return station_info
+
+
+    def by_id(self, id_station: str) -> dict | None:
+        """Get a station information from its id.
+
+        Args:
+            id_station (str): station id number.
+
+        Returns:
+            dict | None: station information or None if the id is unknown.
+        """
+        try:
+            position = self._positions.get_loc(id_station)
+        except KeyError:
+            return None
+
+        return self.by_position(position)
+
+
+    def nearest(self, lat_lon: list) -> dict:
+        """Get information for the nearest station calculated with geodesic
+        distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from.
+
+        Returns:
+            dict: nearest station information with its distance in km.
+        """
+        position, km = self.index.nearest(lat_lon)
+        station_info = self.by_position(position)
+        station_info['distance'] = km
+
+        return station_info
+
+
+    def _with_distances(self, found: list[tuple[int, float]]) -> list[dict]:
+        stations = []
+        for position, km in found:
+            station_info = self.by_position(position)
+            station_info['distance'] = km
+            stations.append(station_info)
+
+        return stations
+
+
+    def k_nearest(self, lat_lon: list, k: int) -> list[dict]:
+        """Get information for the k nearest stations calculated with geodesic
+        distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from ;
+            k (int): number of stations.
+
+        Returns:
+            list[dict]: stations information with their distance in km,
+            nearest first.
+        """
+        return self._with_distances(self.index.k_nearest(lat_lon, k))
+
+
+    def within(self, lat_lon: list, radius_km: float) -> list[dict]:
+        """Get information for the stations within a radius calculated with
+        geodesic distance.
+
+        Args:
+            lat_lon (list): coordinates to calculate distance from ;
+            radius_km (float): radius in km.
+
+        Returns:
+            list[dict]: stations information with their distance in km,
+            nearest first.
+        """
+        return self._with_distances(self.index.within(lat_lon, radius_km))
+
+
+def _file_stamp(path: Path) -> tuple[int, int] | None:
+    """Identify a version of a file by its modification time and size."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+_catalogue = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue() -> StationCatalogue:
+    """Get the process-wide stations catalogue, reloading it if the csv file
+    has been regenerated since it was loaded.
+
+    While a thread reloads it, the other ones keep using the previous
+    catalogue instead of waiting.
+
+    Returns:
+        StationCatalogue: stations catalogue.
+    """
+    global _catalogue
+
+    catalogue = _catalogue
+    if catalogue is not None and catalogue.stamp == catalogue.current_stamp():
+        return catalogue
+
+    # Keep using the previous catalogue while another thread reloads it
+    if not _catalogue_lock.acquire(blocking=catalogue is None):
+        return catalogue
+
+    try:
+        # Another thread may have reloaded the file while we were waiting
+        if _catalogue is None or _catalogue.stamp != _catalogue.current_stamp():
+            _catalogue = StationCatalogue()
+
+        return _catalogue
+    finally:
+        _catalogue_lock.release()
+
+
+def invalidate_catalogue():
+    """Force the stations catalogue to be reloaded on next access."""
+    global _catalogue
+
+    with _catalogue_lock:
+        _catalogue = None
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
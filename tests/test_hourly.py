@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pandas as pd
+
+from hourly import HourlyDataset
+
+
+def _chunk(start: datetime, end: datetime) -> pd.DataFrame:
+    dates = pd.date_range(start, end, freq='h')
+    return pd.DataFrame({
+        'POSTE': '07149001',
+        'DATE': dates,
+        'T': pd.Series(range(len(dates)), dtype='float32'),
+        'U': pd.Series(range(len(dates)), dtype='float32'),
+    })
+
+
+def test_load_range_with_empty_chunk(tmp_path):
+    dataset = HourlyDataset('07149001', tmp_path)
+    dataset.put(datetime(2020, 1, 1), datetime(2020, 3, 31, 23),
+                _chunk(datetime(2020, 3, 30), datetime(2020, 3, 31, 23)))
+    # Station not reporting yet over the next chunk
+    dataset.write(datetime(2020, 4, 1), datetime(2020, 6, 30, 23), [])
+
+    df = dataset.load(datetime(2020, 3, 31), datetime(2020, 6, 30, 23),
+                      columns=['T'])
+
+    assert list(df.columns) == ['POSTE', 'DATE', 'T']
+    assert len(df.index) == 24
+    assert df['POSTE'].dtype == object and df['T'].dtype == 'float32'
+
+
+def test_load_parameter_missing_from_a_chunk(tmp_path):
+    dataset = HourlyDataset('07149001', tmp_path)
+    dataset.put(datetime(2020, 1, 1), datetime(2020, 3, 31, 23),
+                _chunk(datetime(2020, 3, 31), datetime(2020, 3, 31, 23))
+                .drop(columns='U'))
+    dataset.put(datetime(2020, 4, 1), datetime(2020, 6, 30, 23),
+                _chunk(datetime(2020, 4, 1), datetime(2020, 4, 1, 23)))
+
+    df = dataset.load(columns=['T', 'U'])
+
+    assert len(df.index) == 48
+    assert df['U'].isna().sum() == 24
@@ -0,0 +1,133 @@
+"""
+HTTP transport shared by all the outbound requests of the application.
+
+A single session keeps a pool of keep-alive connections per host, applies
+default timeouts and retries the requests failing on connection errors or
+with a 429 / 5xx status, after a jittered exponential backoff (or the delay of
+the 'Retry-After' header, capped) so that concurrent sessions don't retry
+together. A POST, which may place an order, is only sent again when it has not
+been processed : on a connection error or a 429 status.
+"""
+
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import constants
+from metrics import METRICS, InstrumentedSession, endpoint_name
+
+
+class JitteredRetry(Retry):
+    """Retry policy with a full jitter on the backoff, recording the retries
+    in the metrics."""
+
+    def get_backoff_time(self) -> float:
+        backoff = min(super().get_backoff_time(), constants.HTTP_BACKOFF_MAX)
+
+        return random.uniform(0, backoff)
+
+
+    def get_retry_after(self, response) -> float | None:
+        # The delay asked by the server is waited in the thread of the request
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+
+        return min(retry_after, constants.HTTP_RETRY_AFTER_MAX)
+
+
+    def is_retry(self, method: str, status_code: int,
+                 has_retry_after: bool = False) -> bool:
+        if method.upper() == 'POST':
+            # An order may have been placed before a 5xx, sending it again
+            # would place another one
+            return status_code == requests.codes.too_many_requests
+
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+    def increment(self, method=None, url=None, *args, **kwargs) -> Retry:
+        # Raises once the retries are exhausted
+        retry = super().increment(method, url, *args, **kwargs)
+        if url is not None:
+            METRICS.retry(endpoint_name(url))
+
+        return retry
+
+
+class TimeoutAdapter(HTTPAdapter):
+    """Adapter applying a default timeout to the requests without one."""
+
+    def __init__(self, *args, timeout: tuple[float, float], **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+
+    def send(self, request: requests.PreparedRequest, timeout=None,
+             **kwargs) -> requests.Response:
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def build_retry(total: int = constants.HTTP_RETRIES) -> Retry:
+    """Build the retry policy of the transport.
+
+    Args:
+        total (int, optional): maximum number of retries of a request.
+
+    Returns:
+        Retry: retry policy.
+    """
+    return JitteredRetry(
+        total=total,
+        backoff_factor=constants.HTTP_BACKOFF_FACTOR,
+        status_forcelist=constants.HTTP_RETRY_STATUSES,
+        # The POST requests are only retried on a 429 status, see 'is_retry',
+        # and on connection errors, not on read errors
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        # The last response is returned to the caller
+        raise_on_status=False
+    )
+
+
+def build_session(
+        retries: int = constants.HTTP_RETRIES,
+        timeout: tuple[float, float] = (constants.HTTP_CONNECT_TIMEOUT,
+                                        constants.HTTP_READ_TIMEOUT)
+    ) -> requests.Session:
+    """Build a session with a connection pool per host sized for concurrent
+    use by all the sessions of the application.
+
+    Args:
+        retries (int, optional): maximum number of retries of a request ;
+        timeout (tuple[float, float], optional): connect and read timeouts in
+        seconds.
+
+    Returns:
+        requests.Session: instrumented session.
+    """
+    session = InstrumentedSession()
+    adapter = TimeoutAdapter(
+        pool_connections=constants.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=constants.HTTP_POOL_MAXSIZE,
+        max_retries=build_retry(retries),
+        timeout=timeout
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+
+# Connection pools shared by every request of the process
+SESSION = build_session()
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,129 @@
+"""
+Maintenance of the datasets of the application and helpers of the page.
+
+The stations list, the communes used by the city search and the station to
+commune table, which saves the application from reverse geocoding the
+stations live, are downloaded or built from the command line.
+
+Run from the repository root :
+python utils.py stations
+python utils.py communes
+python utils.py station-communes
+"""
+
 from pathlib import Path
+from functools import lru_cache
+import argparse
+import csv
 import math
 
 import requests
-import pandas as pd
-from geopy import distance
 
 
 from meteo_france import Client
+from transport import SESSION
 import constants
+import files
+import stations
 
 
 def download_station_list_to_csv():
-    """Download in csv the stations list requested from Météo France API."""
-    # Set folder and filename
-    DATASETS_FOLDER = 'datasets'
-    FILENAME = 'weather-stations-list.csv'
+    """Download in csv the stations list requested from Météo France API, if
+    it has changed since the last download, and report the added and removed
+    stations."""
+    p = Path(__file__).parent.absolute()
+    csv_filepath = p / constants.WEATHER_STATION_LIST_PATH
+    sidecar_filepath = p / constants.WEATHER_STATION_SIDECAR_PATH
 
     client = Client()
-    r = client.get_stations_list()
-
-    if r.status_code == requests.codes.ok:
-        # Generate the csv filepath
-        p = Path(__file__).parent.absolute() 
-        q = p / DATASETS_FOLDER
-        Path(q).mkdir(parents=True, exist_ok=True)
-        csv_filepath = q / FILENAME
-
-        # Write response text to the csv file
-        with open(csv_filepath, 'w', encoding='utf-8') as f:
-            f.write(r.text)
-
-        print('Création du fichier réalisée avec succès.')
+    r = client.get_stations_list(
+        etag=stations.sidecar_metadata(sidecar_filepath).get('etag'))
+
+    if r.status_code == requests.codes.not_modified:
+        print('La liste des stations est déjà à jour.')
+    elif r.status_code == requests.codes.ok:
+        if (csv_filepath.exists() and stations.content_hash(r.content)
+                == stations.content_hash(csv_filepath.read_bytes())):
+            # Send the ETag of the list with the next request
+            stations.tag_station_list(
+                r.headers.get('ETag'), csv_filepath, sidecar_filepath)
+            print('La liste des stations est déjà à jour.')
+        else:
+            # The running applications reload the new list on their next
+            # access
+            report = stations.publish_station_list(
+                r.content, csv_filepath, sidecar_filepath,
+                r.headers.get('ETag'))
+
+            print('Création du fichier réalisée avec succès.')
+            for label, ids in (('ajoutée(s)', report['added']),
+                               ('supprimée(s)', report['removed'])):
+                print(f'{len(ids)} station(s) {label}'
+                      + (f' : {", ".join(ids)}' if ids else ''))
     else:
         print(f'Erreur : status_code {r.status_code} - {r.reason}')
+        return
+
+    # Precompute the communes of the new stations, or of all of them if the
+    # table has never been built
+    communes_filepath = p / constants.STATION_COMMUNES_PATH
+    if not station_communes_table_is_complete(communes_filepath):
+        build_station_communes_table(communes_filepath)
+
+
+def download_communes_to_csv():
+    """Download in csv the French municipalities with their department,
+    region, position and population, used for the offline city search."""
+    communes = SESSION.get(
+        constants.COMMUNES_URL,
+        params={'fields': 'nom,code,codeDepartement,codeRegion,centre,population',
+                'format': 'json'}
+    )
+    departements = SESSION.get(constants.DEPARTEMENTS_URL)
+    regions = SESSION.get(constants.REGIONS_URL)
+
+    for r in (communes, departements, regions):
+        if r.status_code != requests.codes.ok:
+            print(f'Erreur : status_code {r.status_code} - {r.reason}')
+            return
+
+    departement_names = {d['code']: d['nom'] for d in departements.json()}
+    region_names = {d['code']: d['nom'] for d in regions.json()}
+
+    rows = []
+    for commune in communes.json():
+        if not commune.get('centre'):
+            continue
+        lon, lat = commune['centre']['coordinates']
+        department = commune.get('codeDepartement', '')
+        rows.append({
+            'name': commune['nom'],
+            'citycode': commune['code'],
+            'department': department,
+            'context': ', '.join(filter(None, [
+                department,
+                departement_names.get(department),
+                region_names.get(commune.get('codeRegion'))
+            ])),
+            'latitude': lat,
+            'longitude': lon,
+            'population': commune.get('population', 0)
+        })
+
+    if not rows:
+        print('Erreur : aucune commune reçue, le fichier n\'est pas modifié.')
+        return
+
+    def write(tmp_filepath: Path):
+        with open(tmp_filepath, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]), delimiter=';')
+            writer.writeheader()
+            writer.writerows(rows)
+
+    # Replace the file at once for the running applications
+    files.write_atomic(constants.COMMUNES_PATH, write)
+
+    print(f'Création du fichier des communes réalisée ({len(rows)} communes).')
 
 
 def search_city(query: str) -> requests.Response:
@@ -44,7 +135,7 @@ def search_city(query: str) -> requests.Response:
     Returns:
         requests.Response: response from the API.
     """
-    r = requests.get(
+    r = SESSION.get(
     constants.ADRESS_SEARCH_URL,
     params={
         'q': query,
@@ -57,36 +148,142 @@ def search_city(query: str) -> requests.Response:
     return r
 
 
-def _reverse_search_city(lat_lon: list) -> requests.Response:
+def _reverse_search_city(lat_lon: list) -> dict | list:
     """search a city from its coordinates.
 
     Args:
         lat_lon (list): city coordinates.
 
     Returns:
-        requests.Response: response from the API or an empty list if no result
-        found.
+        dict | list: first feature found by the API or an empty list if no
+        result found.
+    """
+    return _cached_reverse_search_city(float(lat_lon[0]), float(lat_lon[1]))
+
+
+@lru_cache(maxsize=constants.REVERSE_SEARCH_CACHE_SIZE)
+def _cached_reverse_search_city(lat: float, lon: float) -> dict | list:
+    """Search a city from its coordinates, widening the search by rounding the
+    latitude a bounded number of times if no street is found.
+
+    Args:
+        lat (float): latitude ;
+        lon (float): longitude.
+
+    Raises:
+        requests.RequestException: if a request fails, so that the failure
+        is not kept in the cache.
+
+    Returns:
+        dict | list: first feature found by the API or an empty list if no
+        result found.
     """
-    lat = lat_lon[0]
-    lon = lat_lon[1]
-    x = len(str(lat))
+    features = []
 
-    while x > 0:
-        url = constants.REVERSE_ADRESS_URL
+    for decimals in constants.REVERSE_SEARCH_DECIMALS:
         payload = {
             'lon': lon,
-            'lat': str(lat)[:x],
+            'lat': round(lat, decimals),
             'type': 'street',
             'limit': 1
         }
-        r = requests.get(url, params=payload)
+        r = SESSION.get(constants.REVERSE_ADRESS_URL, params=payload)
+        r.raise_for_status()
 
-        if r.json().get('features'):
-                return r.json().get('features')[0]
-        else:
-            x -= 1
-    
-    return r.json().get('features')
+        features = r.json().get('features') or []
+        if features:
+            return features[0]
+
+    return features
+
+
+def station_communes_table_is_complete(
+        csv_filepath: Path | None = None) -> bool:
+    """Check that the station to commune table has a row for every station of
+    the list.
+
+    Args:
+        csv_filepath (Path | None, optional): path of the table, the one of
+        the application if None.
+
+    Returns:
+        bool: True if no station is missing from the table.
+    """
+    csv_filepath = Path(csv_filepath or constants.STATION_COMMUNES_PATH)
+    if not csv_filepath.exists():
+        return False
+
+    with open(csv_filepath, encoding='utf-8') as f:
+        known = {row['id_station'] for row in csv.DictReader(f, delimiter=';')}
+
+    return set(stations.StationCatalogue().df['id_station']) <= known
+
+
+def build_station_communes_table(csv_filepath: Path | None = None):
+    """Reverse geocode every station once and write the station to commune
+    table used by the application instead of live requests.
+
+    Stations already in the table with a commune are not requested again.
+    Stations whose request fails are left out of the table, the application
+    looks them up live and the next build requests them again. The table is
+    written every few stations so that an interruption keeps the progress.
+
+    Args:
+        csv_filepath (Path | None, optional): path of the table, the one of
+        the application if None.
+    """
+    csv_filepath = Path(csv_filepath or constants.STATION_COMMUNES_PATH)
+
+    known = {}
+    if csv_filepath.exists():
+        with open(csv_filepath, encoding='utf-8') as f:
+            reader = csv.DictReader(f, delimiter=';')
+            known = {row['id_station']: row for row in reader}
+
+    catalogue = stations.StationCatalogue().df
+
+    def write(tmp_filepath: Path):
+        # Stations removed from the list are dropped from the table
+        rows = [known[id_station] for id_station in catalogue['id_station']
+                if id_station in known]
+        with open(tmp_filepath, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=['id_station', 'city', 'context'], delimiter=';')
+            writer.writeheader()
+            writer.writerows(rows)
+
+    failed = requested = 0
+    try:
+        for station in catalogue.itertuples():
+            row = known.get(station.id_station)
+            if row is not None and row['city'] != '-':
+                continue
+
+            try:
+                reverse_info = _reverse_search_city(
+                    [station.latitude, station.longitude])
+            except requests.RequestException:
+                failed += 1
+                continue
+
+            properties = (reverse_info or {}).get('properties', {})
+            known[station.id_station] = {
+                'id_station': station.id_station,
+                'city': properties.get('city', '-'),
+                'context': properties.get('context', '-')
+            }
+            requested += 1
+            if requested % constants.STATION_COMMUNES_SAVE_EVERY == 0:
+                files.write_atomic(csv_filepath, write)
+    finally:
+        # Replace the table at once for the running applications
+        files.write_atomic(csv_filepath, write)
+
+    print(f'Table des communes des stations créée '
+          f'({catalogue["id_station"].isin(list(known)).sum()} stations).')
+    if failed:
+        print(f'{failed} station(s) en échec, redemandée(s) au prochain '
+              f'lancement.')
 
 
 def _get_nearest_station_information(lat_lon: list) -> dict:
@@ -99,25 +296,8 @@ def _get_nearest_station_information(lat_lon: list) -> dict:
     Returns:
         dict: nearest station information.
     """
-    df = pd.read_csv(
-        constants.WEATHER_STATION_LIST_PATH,
-        sep=';',
-        dtype={'Id_station': object},
-        parse_dates=['Date_ouverture']
-    )
-
-    df.columns = df.columns.str.lower()
-    df['nom_usuel'] = df['nom_usuel'].str.title()
-
-    if ('latitude' and 'longitude' in df.columns) and lat_lon:
-        df['distance'] = df.apply(
-            lambda x: distance.distance(
-                [x['latitude'], x['longitude']],
-                lat_lon).km,
-                axis='columns'
-        )
-
-        return df.nsmallest(1, 'distance').to_dict('records')[0]
+    if lat_lon:
+        return stations.get_catalogue().nearest(lat_lon)
 
 
 def filter_nearest_station_information(lat_lon: list) -> dict:
@@ -132,8 +312,16 @@ def filter_nearest_station_information(lat_lon: list) -> dict:
     """
     station_info = _get_nearest_station_information(lat_lon)
 
-    reverse_info = _reverse_search_city([station_info['latitude'],
-                                         station_info['longitude']])
+    if station_info.get('city') is not None:
+        # Commune found in the precomputed table
+        reverse_info = {'properties': {'city': station_info['city'],
+                                       'context': station_info['context']}}
+    else:
+        try:
+            reverse_info = _reverse_search_city([station_info['latitude'],
+                                                 station_info['longitude']])
+        except requests.RequestException:
+            reverse_info = None
 
     if not reverse_info:
         reverse_info = {'properties': {'city': '-', 'context': '-'}}
@@ -149,6 +337,27 @@ def filter_nearest_station_information(lat_lon: list) -> dict:
     }
 
 
+def nearest_stations_information(lat_lon: list, k: int) -> list[dict]:
+    """Get the k nearest stations with only what is useful for the Streamlit
+    app, without looking up their communes.
+
+    Args:
+        lat_lon (list): city coordinates ;
+        k (int): number of stations.
+
+    Returns:
+        list[dict]: stations information, nearest first.
+    """
+    return [
+        {
+            'id_station': station_info.get('id_station'),
+            'nom_usuel': station_info.get('nom_usuel'),
+            'distance': station_info.get('distance')
+        }
+        for station_info in stations.get_catalogue().k_nearest(lat_lon, k)
+    ]
+
+
 def calculate_delta(x: float, y: float, rel_tol: float) -> float:
     """Calculates the difference between two numbers.
 
@@ -172,7 +381,23 @@ def calculate_delta(x: float, y: float, rel_tol: float) -> float:
  
 
 def main():
-    pass
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser(
+        'stations', help='met à jour la liste des stations et la table des '
+                         'communes des stations')
+    commands.add_parser(
+        'communes', help='télécharge les communes de la recherche de ville')
+    commands.add_parser(
+        'station-communes', help='complète la table des communes des stations')
+    args = parser.parse_args()
+
+    if args.command == 'stations':
+        download_station_list_to_csv()
+    elif args.command == 'communes':
+        download_communes_to_csv()
+    else:
+        build_station_communes_table()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file